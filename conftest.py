@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_caches(django_test_environment):
+    """Общий кеш на время тестов — во временном файле, не в рабочем."""
+    from core.test_runner import isolated_caches
+
+    with isolated_caches():
+        yield
@@ -0,0 +1,58 @@
+"""Тесты не должны трогать общий кеш и базу работающего сайта.
+
+Общий уровень TwoLevelCache — файл SQLite, который видят все процессы
+на машине. На время тестов он переносится во временный каталог, чтобы
+cache.clear() в тестах не стирал рабочий кеш, а параллельные прогоны не
+мешали друг другу. Туда же IsolatedRunner кладёт тестовую базу SQLite:
+в отличие от базы в памяти её видят процессы пула миниатюр.
+"""
+import contextlib
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextlib.contextmanager
+def isolated_caches(directory=None):
+    own_directory = directory is None
+    if own_directory:
+        directory = tempfile.mkdtemp(prefix='yatube-test-')
+    caches = copy.deepcopy(settings.CACHES)
+    for alias, config in caches.items():
+        shared = config.get('OPTIONS', {}).get('SHARED')
+        if shared is not None:
+            shared['LOCATION'] = os.path.join(directory, f'{alias}.sqlite3')
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        if own_directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+class IsolatedRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.directory = tempfile.mkdtemp(prefix='yatube-test-')
+        self._isolated_caches = isolated_caches(self.directory)
+        self._isolated_caches.__enter__()
+
+    def setup_databases(self, **kwargs):
+        for connection in connections.all():
+            test_settings = connection.settings_dict['TEST']
+            if connection.vendor == 'sqlite' and not test_settings['NAME']:
+                test_settings['NAME'] = os.path.join(
+                    self.directory, f'db-{connection.alias}.sqlite3'
+                )
+        return super().setup_databases(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        self._isolated_caches.__exit__(None, None, None)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
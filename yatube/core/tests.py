@@ -0,0 +1,167 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from .cache import SQLiteCache, TwoLevelCache
+
+
+class CacheTestMixin:
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'shared.sqlite3')
+
+    def two_level(self, location, **options):
+        options.setdefault('SHARED', {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': self.path,
+        })
+        options.setdefault('SHARED_ONLY_PREFIXES', ['version:'])
+        return TwoLevelCache(
+            f'{self.directory}-{location}', {'OPTIONS': options}
+        )
+
+
+class SQLiteCacheTests(CacheTestMixin, SimpleTestCase):
+    def test_add_does_not_overwrite_live_key(self):
+        cache = SQLiteCache(self.path, {})
+        self.assertTrue(cache.add('lock', 1))
+        self.assertFalse(cache.add('lock', 2))
+        self.assertEqual(cache.get('lock'), 1)
+
+    def test_expired_key_is_missing(self):
+        cache = SQLiteCache(self.path, {})
+        cache.set('key', 'значение', 0.05)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('key'))
+        self.assertTrue(cache.add('key', 'новое'))
+
+    def test_incr_and_get_many_share_one_file(self):
+        writer = SQLiteCache(self.path, {})
+        reader = SQLiteCache(self.path, {})
+        writer.set('counter', 1)
+        writer.set('object', {'a': [1, 2]})
+        self.assertEqual(reader.incr('counter', 5), 6)
+        self.assertEqual(
+            writer.get_many(['counter', 'object', 'missing']),
+            {'counter': 6, 'object': {'a': [1, 2]}},
+        )
+        with self.assertRaises(ValueError):
+            writer.incr('object')
+
+
+class TwoLevelCacheTests(CacheTestMixin, SimpleTestCase):
+    def test_local_level_is_bounded(self):
+        cache = self.two_level(
+            'bounded', LOCAL_MAX_ENTRIES=2, LOCAL_MAX_BYTES=10 ** 6
+        )
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        self.assertEqual(len(cache.local.entries), 2)
+        cache.set('big', 'x' * 2 * 10 ** 6)
+        self.assertLessEqual(cache.local.size, 10 ** 6)
+        self.assertEqual(cache.get('big'), 'x' * 2 * 10 ** 6)
+
+    def test_shared_only_keys_see_other_workers(self):
+        """версии читаются из общего уровня, минуя локальную копию."""
+        first = self.two_level('first')
+        second = self.two_level('second')
+        first.set('version:index', 1)
+        first.set('page', 'старая')
+        self.assertEqual(first.get('version:index'), 1)
+        second.incr('version:index')
+        second.set('page', 'новая')
+        self.assertEqual(first.get('version:index'), 2)
+        self.assertEqual(first.get('page'), 'старая')
+
+    def test_delete_is_broadcast_to_other_workers(self):
+        first = self.two_level('first', SYNC_INTERVAL=0)
+        second = self.two_level('second', SYNC_INTERVAL=0)
+        first.set('page', 'значение')
+        self.assertEqual(second.get('page'), 'значение')
+        first.delete('page')
+        self.assertIsNone(second.get('page'))
+
+
+class TestRunnerCacheTests(SimpleTestCase):
+    def test_shared_cache_is_not_the_site_one(self):
+        """тесты пишут общий кеш во временный файл."""
+        site_path = os.path.join(settings.BASE_DIR, 'cache', 'shared.sqlite3')
+        self.assertNotEqual(cache.shared._path, site_path)
+        self.assertTrue(
+            cache.shared._path.startswith(tempfile.gettempdir())
+        )
+
+
+class MediaViewTests(SimpleTestCase):
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        os.makedirs(os.path.join(self.directory, 'posts'))
+        with open(os.path.join(self.directory, 'posts', 'a.gif'), 'wb') as f:
+            f.write(self.content)
+        media_root = override_settings(MEDIA_ROOT=self.directory)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.url = '/media/posts/a.gif'
+
+    def test_file_is_streamed_with_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        self.assertIn('max-age', response['Cache-Control'])
+        response.close()
+        response = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertIn('max-age', response['Cache-Control'])
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(
+            b''.join(response.streaming_content), self.content[10:20]
+        )
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(
+            b''.join(response.streaming_content), self.content[-4:]
+        )
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+        self.assertFalse(response.has_header('Cache-Control'))
+
+    def test_failed_precondition_is_not_cached(self):
+        response = self.client.get(self.url, HTTP_IF_MATCH='"старый"')
+        self.assertEqual(response.status_code, 412)
+        self.assertFalse(response.has_header('Cache-Control'))
+
+    def test_stale_if_range_returns_whole_file(self):
+        response = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"старый"'
+        )
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    @override_settings(MEDIA_ACCEL='nginx')
+    def test_nginx_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected-media/posts/a.gif'
+        )
+        self.assertEqual(response.content, b'')
+
+    def test_paths_outside_media_root_not_found(self):
+        for url in ('/media/../manage.py', '/media/posts/', '/media/nope'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
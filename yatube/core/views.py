@@ -0,0 +1,139 @@
+"""Раздача MEDIA_ROOT без отдельной настройки веб-сервера под каждый файл.
+
+Поддерживаются условные запросы (ETag, Last-Modified → 304) и диапазоны
+байт. При MEDIA_ACCEL = 'nginx' или 'sendfile' тело отдаёт фронтовой
+сервер по заголовку X-Accel-Redirect или X-Sendfile, иначе файл целиком
+уходит через FileResponse (wsgi.file_wrapper, то есть sendfile, если
+сервер его умеет).
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+# Ответы, которые можно кешировать на MEDIA_MAX_AGE: 412 и 416 зависят от
+# заголовков запроса и не должны оседать в общих кешах.
+CACHEABLE_STATUSES = {200, 206, 304}
+
+
+def parse_range(header, size):
+    """(start, end) для одного диапазона; None — отдать файл целиком.
+
+    Диапазон за пределами файла даёт ValueError.
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def if_range_matches(request, etag, mtime):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def accel_response(path, full_path):
+    response = HttpResponse()
+    if settings.MEDIA_ACCEL == 'nginx':
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_PREFIX + quote(path)
+        )
+    else:
+        response['X-Sendfile'] = full_path
+    # Тип определит фронтовой сервер.
+    del response['Content-Type']
+    return response
+
+
+def file_response(request, full_path, size, etag, mtime):
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and if_range_matches(request, etag, mtime):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                read_range(full_path, start, length), status=206
+            )
+            response['Content-Length'] = length
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            return response
+    return FileResponse(open(full_path, 'rb'))
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        if settings.MEDIA_ACCEL:
+            response = accel_response(path, full_path)
+        else:
+            response = file_response(
+                request, full_path, stat.st_size, etag, stat.st_mtime
+            )
+            content_type, encoding = mimetypes.guess_type(full_path)
+            response['Content-Type'] = (
+                content_type or 'application/octet-stream'
+            )
+            response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if response.status_code in CACHEABLE_STATUSES:
+        patch_cache_control(
+            response, public=True, max_age=settings.MEDIA_MAX_AGE
+        )
+    return response
@@ -1,6 +1,22 @@
-from django.contrib import admin
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME, ActionForm
+from django.template.response import TemplateResponse
 
-from .models import Post, Group
+from .bulk import delete_posts, move_to_group, reassign_author
+from .models import Group, ImageIngest, Post, User
+from .paginator import CachedCountPaginator
+from .search import search_posts
+
+
+class PostActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        required=False,
+        label='Группа',
+    )
+    author = forms.CharField(required=False, label='Автор (username)')
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -11,11 +27,112 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group'
     )
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    show_full_result_count = False
+    action_form = PostActionForm
+    actions = (
+        'move_to_group', 'remove_from_group', 'reassign_author',
+        'delete_posts',
+    )
+
+    def get_actions(self, request):
+        # Стандартное удаление шлёт сигналы на каждую строку.
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        return CachedCountPaginator(
+            queryset,
+            per_page,
+            orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+            estimate_above=settings.POSTS_ADMIN_COUNT_ESTIMATE_ABOVE,
+        )
+
+    def move_to_group(self, request, queryset):
+        group = Group.objects.filter(
+            pk=request.POST.get('group') or None
+        ).first()
+        if group is None:
+            self.message_user(
+                request,
+                'Выберите группу. Убрать посты из групп можно '
+                'действием «Убрать из группы».',
+                messages.ERROR,
+            )
+            return
+        moved = move_to_group(queryset, group)
+        self.message_user(request, f'Перенесено постов: {moved} в «{group}»')
+    move_to_group.short_description = 'Перенести в группу'
+    move_to_group.allowed_permissions = ('change',)
+
+    def remove_from_group(self, request, queryset):
+        removed = move_to_group(queryset, None)
+        self.message_user(request, f'Убрано из групп постов: {removed}')
+    remove_from_group.short_description = 'Убрать из группы'
+    remove_from_group.allowed_permissions = ('change',)
+
+    def reassign_author(self, request, queryset):
+        username = request.POST.get('author', '').strip()
+        author = User.objects.filter(username=username).first()
+        if author is None:
+            self.message_user(
+                request, f'Нет пользователя «{username}»', messages.ERROR
+            )
+            return
+        reassigned = reassign_author(queryset, author)
+        self.message_user(
+            request, f'Передано постов: {reassigned} автору {author}'
+        )
+    reassign_author.short_description = 'Передать другому автору'
+    reassign_author.allowed_permissions = ('change',)
+
+    def delete_posts(self, request, queryset):
+        """Как delete_selected: сначала страница подтверждения."""
+        if request.POST.get('post') != 'yes':
+            return TemplateResponse(
+                request,
+                'admin/posts/post/delete_posts_confirmation.html',
+                {
+                    **self.admin_site.each_context(request),
+                    'title': 'Удалить выбранные посты?',
+                    'opts': self.model._meta,
+                    'media': self.media,
+                    'count': queryset.count(),
+                    'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+                    'select_across': request.POST.get('select_across') == '1',
+                    'action_checkbox_name': ACTION_CHECKBOX_NAME,
+                },
+            )
+        deleted = delete_posts(queryset)
+        self.message_user(request, f'Удалено постов: {deleted}')
+    delete_posts.short_description = 'Удалить выбранные посты'
+    delete_posts.allowed_permissions = ('delete',)
+
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по полнотекстовому индексу вместо LIKE по всей таблице."""
+        if not search_term:
+            return queryset, False
+        return search_posts(queryset, search_term), False
 
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
+
+
+@admin.register(ImageIngest)
+class ImageIngestAdmin(admin.ModelAdmin):
+    list_display = (
+        'name',
+        'original_bytes',
+        'stored_bytes',
+        'saved_bytes',
+        'created'
+    )
+    search_fields = ('name',)
+    list_filter = ('created',)
@@ -0,0 +1,156 @@
+"""JSON API только для чтения: ленты и пост.
+
+Ответы собираются из строк .values() без создания моделей. Ленты
+листаются курсором ?cursor= (тот же ключ (pub_date, pk), что у HTML-лент)
+по ?limit= постов. ETag ленты — её версия из кеша, поэтому повторный
+запрос с If-None-Match получает 304 без обращения к базе. ETag поста —
+хеш тела ответа.
+"""
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import urlencode
+from django.views.decorators.http import require_safe
+
+from core.decorators import query_budget
+from .cache import INDEX_FEED, author_feed, group_feed
+from .conditional import feed_condition
+from .models import Group, Post, User
+from .paginator import after_cursor, decode_cursor, make_cursor
+from .purge import (INDEX_KEY, author_key, cache_at_edge, group_key,
+                    post_key)
+from .storage import image_storage
+
+API_POST_COUNT = 10
+API_MAX_POST_COUNT = 100
+POST_FIELDS = ('id', 'text', 'pub_date')
+
+
+def json_response(data, status=200):
+    return HttpResponse(
+        json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False),
+        content_type='application/json',
+        status=status,
+    )
+
+
+def error_response(message, status):
+    return json_response({'detail': message}, status=status)
+
+
+def post_rows(queryset, *fields):
+    return queryset.values(
+        *POST_FIELDS,
+        *fields,
+        image_name=F('image'),
+        author_username=F('author__username'),
+        group_slug=F('group__slug'),
+    )
+
+
+def serialize_post(row):
+    image = row.pop('image_name')
+    row['image'] = image_storage.url(image) if image else None
+    row['author'] = row.pop('author_username')
+    row['group'] = row.pop('group_slug')
+    return row
+
+
+def parse_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return API_POST_COUNT
+    return min(max(limit, 1), API_MAX_POST_COUNT)
+
+
+def feed_response(request, queryset, extra=None):
+    """Страница ленты после ?cursor=: посты и ссылка на следующую."""
+    queryset = post_rows(queryset).order_by('-pub_date', '-pk')
+    limit = parse_limit(request.GET.get('limit'))
+    number = 1
+    token = request.GET.get('cursor')
+    if token:
+        cursor = decode_cursor(token)
+        if cursor is None:
+            return error_response('Неверный курсор.', 400)
+        pub_date, pk, number = cursor
+        queryset = after_cursor(queryset, pub_date, pk)
+    rows = list(queryset[:limit + 1])
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_url = request.build_absolute_uri(
+            request.path + '?' + urlencode({
+                'cursor': make_cursor(last['pub_date'], last['id'],
+                                      number + 1),
+                'limit': limit,
+            })
+        )
+    return json_response({
+        **(extra or {}),
+        'results': [serialize_post(row) for row in rows],
+        'next': next_url,
+    })
+
+
+@cache_at_edge(lambda request: [INDEX_KEY])
+@feed_condition(lambda: INDEX_FEED, per_user=False)
+@require_safe
+@query_budget(1)
+def index(request):
+    return feed_response(request, Post.objects.all())
+
+
+@cache_at_edge(lambda request, slug: [group_key(slug)])
+@feed_condition(group_feed, per_user=False)
+@require_safe
+@query_budget(2)
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).values(
+        'id', 'slug', 'title', 'description'
+    ).first()
+    if group is None:
+        return error_response('Группа не найдена.', 404)
+    return feed_response(
+        request, Post.objects.filter(group_id=group['id']), {'group': group}
+    )
+
+
+@cache_at_edge(lambda request, username: [author_key(username)])
+@feed_condition(author_feed, per_user=False)
+@require_safe
+@query_budget(2)
+def profile(request, username):
+    author = User.objects.filter(username=username).values(
+        'id', 'username', 'first_name', 'last_name'
+    ).first()
+    if author is None:
+        return error_response('Автор не найден.', 404)
+    return feed_response(
+        request, Post.objects.filter(author_id=author['id']),
+        {'author': author},
+    )
+
+
+@cache_at_edge(lambda request, post_id: [post_key(post_id)])
+@require_safe
+@query_budget(1)
+def post_detail(request, post_id):
+    row = post_rows(Post.objects.filter(pk=post_id), 'updated_at').first()
+    if row is None:
+        return error_response('Пост не найден.', 404)
+    post = serialize_post(row)
+    post['url'] = request.build_absolute_uri(
+        reverse('posts:post_detail', kwargs={'post_id': post_id})
+    )
+    response = json_response(post)
+    etag = '"{}"'.format(hashlib.md5(response.content).hexdigest())
+    response['ETag'] = etag
+    return get_conditional_response(request, etag=etag, response=response)
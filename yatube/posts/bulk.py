@@ -0,0 +1,109 @@
+"""Массовые изменения постов для действий админки.
+
+Посты меняются пачками по BULK_CHUNK_SIZE: одна пачка — один UPDATE или
+DELETE в своей транзакции. UPDATE сигналов не шлёт, а удаление идёт через
+QuerySet.delete() ради on_delete связанных моделей, но post_deleted внутри
+bulk_changes() ничего не делает. Счётчики авторов и групп, ссылки на
+картинки и кеш лент обновляются после этого разом.
+"""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import (INDEX_FEED, author_feed, bump_versions, count_key,
+                    group_feed)
+from .models import AuthorStats, Group, GroupStats, MediaFile, Post, User
+from .paginator import estimated_count_key
+from .purge import post_key, purge_later
+from .signals import bulk_changes, delete_unused_image
+
+BULK_CHUNK_SIZE = 1000
+
+
+def chunked_pks(queryset):
+    queryset = queryset.order_by('pk')
+    last_pk = 0
+    while True:
+        pks = list(
+            queryset.filter(pk__gt=last_pk).values_list(
+                'pk', flat=True
+            )[:BULK_CHUNK_SIZE]
+        )
+        if not pks:
+            return
+        last_pk = pks[-1]
+        yield pks
+
+
+def collect_owners(posts, author_ids, group_ids):
+    for author_id, group_id in posts.values_list('author_id', 'group_id'):
+        author_ids.add(author_id)
+        if group_id:
+            group_ids.add(group_id)
+
+
+def refresh_owners(author_ids, group_ids, post_ids):
+    """Пересчитывает счётчики и сбрасывает кеш затронутых лент и постов."""
+    for author_id in author_ids:
+        AuthorStats.recount(author_id)
+    for group_id in group_ids:
+        GroupStats.recount(group_id)
+    feeds = [INDEX_FEED]
+    feeds += map(author_feed, User.objects.filter(
+        pk__in=author_ids
+    ).values_list('username', flat=True))
+    feeds += map(group_feed, Group.objects.filter(
+        pk__in=group_ids
+    ).values_list('slug', flat=True))
+    keys = [count_key(feed) for feed in feeds]
+    cache.delete_many(keys + [estimated_count_key(key) for key in keys])
+    bump_versions(feeds)
+    purge_later(map(post_key, post_ids))
+
+
+def update_posts(queryset, **fields):
+    author_ids = {fields['author_id']} if 'author_id' in fields else set()
+    group_ids = {fields['group_id']} if fields.get('group_id') else set()
+    post_ids = []
+    updated = 0
+    for pks in chunked_pks(queryset):
+        posts = Post.objects.filter(pk__in=pks)
+        with transaction.atomic():
+            collect_owners(posts, author_ids, group_ids)
+            updated += posts.update(updated_at=timezone.now(), **fields)
+        post_ids += pks
+    refresh_owners(author_ids, group_ids, post_ids)
+    return updated
+
+
+def move_to_group(queryset, group):
+    return update_posts(queryset, group_id=group.pk if group else None)
+
+
+def reassign_author(queryset, author):
+    return update_posts(queryset, author_id=author.pk)
+
+
+def delete_posts(queryset):
+    author_ids, group_ids = set(), set()
+    post_ids = []
+    deleted = 0
+    for pks in chunked_pks(queryset):
+        posts = Post.objects.filter(pk__in=pks)
+        with transaction.atomic():
+            collect_owners(posts, author_ids, group_ids)
+            images = Counter(
+                posts.exclude(image='').values_list('image', flat=True)
+            )
+            with bulk_changes():
+                deleted += posts.delete()[1].get(Post._meta.label, 0)
+            for name, references in images.items():
+                MediaFile.release(name, references)
+                transaction.on_commit(
+                    lambda name=name: delete_unused_image(name)
+                )
+        post_ids += pks
+    refresh_owners(author_ids, group_ids, post_ids)
+    return deleted
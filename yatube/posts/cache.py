@@ -0,0 +1,225 @@
+import functools
+import hashlib
+import time
+
+from django.core.cache import cache
+
+from .models import Group, Post, User
+from .purge import feed_key, purge_later
+
+INDEX_FEED = 'index'
+COUNT_TIMEOUT = 60 * 10
+# Через PAGE_TIMEOUT страница считается устаревшей и пересобирается одним
+# запросом, остальные до PAGE_STALE_TIMEOUT получают старую копию.
+PAGE_TIMEOUT = 60 * 5
+PAGE_STALE_TIMEOUT = 60 * 60
+# Версию, созданную чтением, а не записью, хранит ограниченное время:
+# иначе каждый выдуманный slug или username из адреса 404 оставлял бы
+# в кеше вечный ключ. Страницы живут не дольше PAGE_STALE_TIMEOUT, а новая
+# initial_version() больше старой, так что истёкшая версия их не оживит.
+VERSION_TIMEOUT = PAGE_STALE_TIMEOUT
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 2
+LOCK_POLL_INTERVAL = 0.05
+METRIC_EVENTS = ('hit', 'miss', 'stale', 'lock_wait')
+
+
+def group_feed(slug):
+    return f'group:{slug}'
+
+
+def author_feed(username):
+    return f'author:{username}'
+
+
+def post_feeds(post):
+    """Ленты, в которые попадает пост."""
+    feeds = [INDEX_FEED, author_feed(post.author.username)]
+    if post.group_id:
+        feeds.append(group_feed(post.group.slug))
+    return feeds
+
+
+def group_feeds(group_id):
+    slug = Group.objects.filter(pk=group_id).values_list(
+        'slug', flat=True
+    ).first()
+    return [group_feed(slug)] if slug else []
+
+
+def author_feeds(author_id):
+    username = User.objects.filter(pk=author_id).values_list(
+        'username', flat=True
+    ).first()
+    return [author_feed(username)] if username else []
+
+
+def group_post_feeds(group_id):
+    """Ленты, где карточки постов группы ссылаются на неё."""
+    usernames = Post.objects.filter(group_id=group_id).values_list(
+        'author__username', flat=True
+    ).distinct()
+    return [INDEX_FEED, *map(author_feed, usernames)]
+
+
+def count_key(feed):
+    return f'posts:count:{feed}'
+
+
+def change_counts(feeds, delta):
+    for feed in feeds:
+        try:
+            cache.incr(count_key(feed), delta)
+        except ValueError:
+            # Счётчика нет в кеше: его посчитает следующий запрос ленты.
+            pass
+
+
+def lock_key(key):
+    return f'posts:lock:{key}'
+
+
+def version_key(feed):
+    return f'posts:version:{feed}'
+
+
+def modified_key(feed):
+    return f'posts:modified:{feed}'
+
+
+def initial_version():
+    # Версия не начинается с единицы: если ключ вытеснят из кеша, старые
+    # страницы не должны снова стать актуальными.
+    return int(time.time() * 1000)
+
+
+def feed_version(feed):
+    key = version_key(feed)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, initial_version(), VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(feeds):
+    for feed in feeds:
+        try:
+            cache.incr(version_key(feed))
+        except ValueError:
+            cache.set(version_key(feed), initial_version(), None)
+    # Время изменения отдаётся как Last-Modified (posts.conditional).
+    cache.set_many(
+        {modified_key(feed): time.time() for feed in feeds}, None
+    )
+    purge_later(map(feed_key, feeds))
+
+
+def page_key(feed, version, request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'posts:page:{feed}:{version}:{path}'
+
+
+def metric_key(name, event):
+    return f'posts:metrics:{name}:{event}'
+
+
+def record_metric(name, *events):
+    for event in events:
+        try:
+            cache.incr(metric_key(name, event))
+        except ValueError:
+            cache.set(metric_key(name, event), 1, None)
+
+
+def get_metrics(name):
+    values = cache.get_many(
+        [metric_key(name, event) for event in METRIC_EVENTS]
+    )
+    return {
+        event: values.get(metric_key(name, event), 0)
+        for event in METRIC_EVENTS
+    }
+
+
+def wait_for_entry(key):
+    deadline = time.time() + LOCK_WAIT
+    while time.time() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_or_compute(key, compute, timeout, stale_timeout,
+                   metrics_name=None, cacheable=None):
+    """Значение из кеша с защитой от одновременного пересчёта.
+
+    Свежая запись отдаётся сразу. Устаревшую (старше timeout) пересчитывает
+    тот, кто взял блокировку, остальные получают старую копию. Если записи
+    нет совсем, остальные ждут до LOCK_WAIT секунд, пока её положат.
+    Счётчики hit/miss/stale/lock_wait пишутся под именем metrics_name и
+    только для кешируемых значений: иначе каждый адрес 404 заводил бы
+    свои вечные счётчики.
+    """
+    metrics_name = metrics_name or key
+    lock = lock_key(key)
+
+    def store(*events):
+        value = compute()
+        if cacheable is None or cacheable(value):
+            cache.set(key, (value, time.time() + timeout), stale_timeout)
+            record_metric(metrics_name, *events)
+        return value
+
+    def locked_store(*events):
+        try:
+            return store(*events)
+        finally:
+            cache.delete(lock)
+
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() < fresh_until:
+            record_metric(metrics_name, 'hit')
+            return value
+        record_metric(metrics_name, 'stale')
+        if cache.add(lock, 1, LOCK_TIMEOUT):
+            return locked_store()
+        return value
+
+    if cache.add(lock, 1, LOCK_TIMEOUT):
+        return locked_store('miss')
+    entry = wait_for_entry(key)
+    if entry is not None:
+        record_metric(metrics_name, 'miss', 'lock_wait')
+        return entry[0]
+    return store('miss', 'lock_wait')
+
+
+def cache_feed_page(get_feed):
+    """Кеширует страницу ленты для анонимных пользователей.
+
+    get_feed получает аргументы view и возвращает имя ленты. Запись
+    в ленте меняет её версию (bump_versions), и старые страницы сразу
+    перестают читаться.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            feed = get_feed(*args, **kwargs)
+            return get_or_compute(
+                page_key(feed, feed_version(feed), request),
+                lambda: view(request, *args, **kwargs),
+                PAGE_TIMEOUT,
+                PAGE_STALE_TIMEOUT,
+                metrics_name=feed,
+                cacheable=lambda response: response.status_code == 200,
+            )
+        return wrapper
+    return decorator
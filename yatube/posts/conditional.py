@@ -0,0 +1,74 @@
+"""Условные GET для страниц постов: ETag и Last-Modified без рендера.
+
+Для лент валидаторы берутся из кеша: версия ленты меняется при любой
+записи в неё, а bump_versions запоминает время изменения. Для страницы
+поста это одна выборка по первичному ключу: updated_at поста и счётчики
+автора. В ETag входит пользователь, потому что шапка и кнопки зависят
+от него.
+"""
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.views.decorators.http import condition
+
+from .cache import feed_version, modified_key
+from .models import Post
+
+
+def feed_modified(feed):
+    """Время последней записи в ленту или None, если оно неизвестно."""
+    modified = cache.get(modified_key(feed))
+    if modified is None:
+        return None
+    return datetime.fromtimestamp(modified, timezone.utc)
+
+
+def feed_condition(get_feed, per_user=True):
+    """condition() для ленты; get_feed получает аргументы view.
+
+    per_user=False — ответ не зависит от пользователя (JSON API, Atom).
+    """
+    def etag(request, *args, **kwargs):
+        version = feed_version(get_feed(*args, **kwargs))
+        if not per_user:
+            return str(version)
+        return f'{version}-{request.user.pk or 0}'
+
+    def last_modified(request, *args, **kwargs):
+        return feed_modified(get_feed(*args, **kwargs))
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def post_validators(request, post_id):
+    if not hasattr(request, '_post_validators'):
+        request._post_validators = Post.objects.filter(
+            pk=post_id
+        ).order_by().values_list(
+            'updated_at',
+            'author__post_stats__posts_count',
+            'author__post_stats__last_pub_date',
+            'author__username',
+        ).first()
+    return request._post_validators
+
+
+def post_etag(request, post_id):
+    validators = post_validators(request, post_id)
+    if validators is None:
+        return None
+    updated_at, posts_count = validators[:2]
+    return f'{updated_at.timestamp()}-{posts_count}-{request.user.pk or 0}'
+
+
+def post_last_modified(request, post_id):
+    validators = post_validators(request, post_id)
+    if validators is None:
+        return None
+    updated_at, _, last_pub_date, _ = validators
+    return max(filter(None, (updated_at, last_pub_date)))
+
+
+post_condition = condition(
+    etag_func=post_etag, last_modified_func=post_last_modified
+)
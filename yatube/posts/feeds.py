@@ -0,0 +1,171 @@
+"""Atom-ленты: все посты, посты группы и посты автора.
+
+Документ пишется потоком прямо из .iterator() одного запроса по индексу
+(pub_date, id) ленты, без сборки в памяти. Повторный опрос с
+If-None-Match/If-Modified-Since отвечается 304 без запросов к базе.
+Заголовок X-Since-Cursor несёт курсор самой новой записи ответа: с
+?since=<курсор> в ответ попадут только посты новее неё. Такой запрос
+читает ATOM_ENTRIES постов, ближайших к курсору, поэтому при большом
+отставании клиент догоняет ленту за несколько опросов, ничего не теряя.
+"""
+import re
+from xml.sax.saxutils import escape, quoteattr
+
+from django.db.models import F, Q
+from django.http import (Http404, HttpResponseBadRequest,
+                         StreamingHttpResponse)
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_safe
+
+from .cache import INDEX_FEED, author_feed, group_feed
+from .conditional import feed_condition, feed_modified
+from .models import Group, Post, User
+from .paginator import decode_cursor, make_cursor
+from .purge import INDEX_KEY, author_key, cache_at_edge, group_key
+
+ATOM_ENTRIES = 50
+ATOM_CHUNK_SIZE = 50
+TITLE_LENGTH = 60
+# Управляющие символы, запрещённые в XML 1.0.
+INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def xml_text(value):
+    return escape(INVALID_XML_RE.sub('', value))
+
+
+def entry_title(text):
+    title = ' '.join(text.split())
+    if len(title) > TITLE_LENGTH:
+        title = title[:TITLE_LENGTH - 1].rstrip() + '…'
+    return title
+
+
+def newer_than(queryset, pub_date, pk):
+    return queryset.filter(
+        Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk),
+        pub_date__gte=pub_date,
+    )
+
+
+def render_entry(request, row):
+    url = request.build_absolute_uri(
+        reverse('posts:post_detail', kwargs={'post_id': row['id']})
+    )
+    name = f'{row["first_name"]} {row["last_name"]}'.strip()
+    return (
+        '<entry>'
+        f'<id>{escape(url)}</id>'
+        f'<title>{xml_text(entry_title(row["text"]))}</title>'
+        f'<link rel="alternate" href={quoteattr(url)}/>'
+        f'<published>{row["pub_date"].isoformat()}</published>'
+        f'<updated>{row["updated_at"].isoformat()}</updated>'
+        f'<author><name>{xml_text(name or row["username"])}</name></author>'
+        f'<content type="text">{xml_text(row["text"])}</content>'
+        '</entry>\n'
+    )
+
+
+def render_feed(request, title, html_url, updated, first, rows):
+    self_url = request.build_absolute_uri(request.path)
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom" xml:lang="ru">\n'
+        f'<id>{escape(self_url)}</id>'
+        f'<title>{xml_text(title)}</title>'
+        f'<link rel="self" href={quoteattr(self_url)}/>'
+        f'<link rel="alternate" '
+        f'href={quoteattr(request.build_absolute_uri(html_url))}/>'
+        f'<updated>{updated.isoformat()}</updated>\n'
+    )
+    if first is not None:
+        yield render_entry(request, first)
+        for row in rows:
+            yield render_entry(request, row)
+    yield '</feed>\n'
+
+
+def entry_rows(queryset, cursor):
+    """Строки записей от самой новой к старой.
+
+    Без курсора — поток самых новых. С курсором — ближайшие к нему посты:
+    они читаются по возрастанию и разворачиваются в памяти (их не больше
+    ATOM_ENTRIES), иначе самые новые вытеснили бы из ответа те, что
+    сразу за курсором.
+    """
+    if cursor:
+        queryset = newer_than(queryset, *cursor[:2]).order_by('pub_date', 'pk')
+    else:
+        queryset = queryset.order_by('-pub_date', '-pk')
+    rows = queryset.values(
+        'id', 'text', 'pub_date', 'updated_at',
+        username=F('author__username'),
+        first_name=F('author__first_name'),
+        last_name=F('author__last_name'),
+    )[:ATOM_ENTRIES]
+    if cursor:
+        return reversed(list(rows))
+    return rows.iterator(chunk_size=ATOM_CHUNK_SIZE)
+
+
+def atom_response(request, queryset, feed, title, html_url):
+    """Поток Atom по постам queryset, начиная с самых новых."""
+    since = request.GET.get('since')
+    cursor = since and decode_cursor(since)
+    if since and cursor is None:
+        return HttpResponseBadRequest('Неверный курсор.')
+    rows = entry_rows(queryset, cursor)
+    # Первая строка нужна до ответа: её курсор уходит в заголовок.
+    first = next(rows, None)
+    updated = feed_modified(feed) or (
+        first['updated_at'] if first else timezone.now()
+    )
+    response = StreamingHttpResponse(
+        render_feed(request, title, html_url, updated, first, rows),
+        content_type='application/atom+xml; charset=utf-8',
+    )
+    if first is not None:
+        since = make_cursor(first['pub_date'], first['id'], 1)
+    if since:
+        response['X-Since-Cursor'] = since
+    return response
+
+
+@cache_at_edge(lambda request: [INDEX_KEY])
+@feed_condition(lambda: INDEX_FEED, per_user=False)
+@require_safe
+def index_atom(request):
+    return atom_response(
+        request, Post.objects.all(), INDEX_FEED,
+        'Yatube: последние записи', reverse('posts:index'),
+    )
+
+
+@cache_at_edge(lambda request, slug: [group_key(slug)])
+@feed_condition(group_feed, per_user=False)
+@require_safe
+def group_atom(request, slug):
+    group = get_object_or_404(Group.objects.only('id', 'title'), slug=slug)
+    return atom_response(
+        request, Post.objects.filter(group_id=group.id), group_feed(slug),
+        f'Yatube: {group.title}',
+        reverse('posts:group_posts', kwargs={'slug': slug}),
+    )
+
+
+@cache_at_edge(lambda request, username: [author_key(username)])
+@feed_condition(author_feed, per_user=False)
+@require_safe
+def author_atom(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True
+    ).first()
+    if author_id is None:
+        raise Http404
+    return atom_response(
+        request, Post.objects.filter(author_id=author_id),
+        author_feed(username), f'Yatube: {username}',
+        reverse('posts:profile', kwargs={'username': username}),
+    )
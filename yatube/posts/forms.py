@@ -1,14 +1,37 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 
+from .ingest import normalize_image
 from .models import Post
+from .uploads import read_image_header
 
 from django.utils.translation import gettext_lazy as _
 
 
+class HeaderImageField(forms.ImageField):
+    """ImageField, которая проверяет только заголовок картинки.
+
+    Стандартная to_python вызывает Image.verify() и читает файл целиком.
+    """
+
+    def to_python(self, data):
+        f = forms.FileField.to_python(self, data)
+        if f is None:
+            return None
+        image = read_image_header(f)
+        f.image = image
+        f.content_type = Image.MIME.get(image.format)
+        return f
+
+
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('group', 'text', 'image')
+        field_classes = {
+            'image': HeaderImageField,
+        }
         labels = {
             'text': _('Writer'),
         }
@@ -25,3 +48,9 @@ class PostForm(forms.ModelForm):
                 'class': 'form-control',
             })
         }
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return normalize_image(image)
+        return image
@@ -0,0 +1,79 @@
+"""Нормализация картинок при загрузке.
+
+Картинка поворачивается по EXIF, теряет метаданные, уменьшается до
+POSTS_IMAGE_MAX_SIDE по большей стороне и пережимается (JPEG —
+прогрессивно, с качеством POSTS_IMAGE_QUALITY). GIF сохраняется как есть,
+чтобы не потерять анимацию. Размеры до и после пишутся в ImageIngest.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image, ImageOps
+
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+
+def save_options(image_format):
+    if image_format == 'JPEG':
+        return {
+            'quality': settings.POSTS_IMAGE_QUALITY,
+            'optimize': True,
+            'progressive': True,
+        }
+    if image_format == 'WEBP':
+        return {'quality': settings.POSTS_IMAGE_QUALITY, 'method': 6}
+    return {'optimize': True}
+
+
+def normalize_image(file):
+    """Нормализованная копия загруженного файла.
+
+    У результата есть атрибут ingest_stats — поля для ImageIngest.
+    """
+    file.seek(0)
+    image = Image.open(file)
+    image_format = image.format
+    stats = {
+        'original_bytes': file.size,
+        'original_width': image.width,
+        'original_height': image.height,
+    }
+    if image_format not in EXTENSIONS:
+        file.seek(0)
+        file.ingest_stats = dict(
+            stats,
+            stored_bytes=file.size,
+            width=image.width,
+            height=image.height,
+        )
+        return file
+    icc_profile = image.info.get('icc_profile')
+    max_side = settings.POSTS_IMAGE_MAX_SIDE
+    # JPEG декодируется сразу в уменьшенном масштабе (1/2…1/8), и в памяти
+    # не бывает картинки больше, чем нужно для max_side. Поворот по EXIF —
+    # уже после уменьшения: рамка квадратная, порядок на размер не влияет.
+    image.draft(None, (max_side, max_side))
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    image = ImageOps.exif_transpose(image)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    options = save_options(image_format)
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    image.save(output, image_format, **options)
+    output.seek(0, os.SEEK_END)
+    name = os.path.splitext(os.path.basename(file.name))[0]
+    normalized = File(output, name + EXTENSIONS[image_format])
+    normalized.ingest_stats = dict(
+        stats,
+        stored_bytes=output.tell(),
+        width=image.width,
+        height=image.height,
+    )
+    output.seek(0)
+    return normalized
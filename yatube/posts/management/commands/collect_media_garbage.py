@@ -0,0 +1,147 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import deserialize
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore
+
+from posts.models import MediaFile, Post
+from posts.thumbnails import delete_image, source_file
+
+IMAGES_DIRECTORY = 'posts'
+
+
+def walk_files(directory):
+    """Файлы MEDIA_ROOT/directory рекурсивно: (имя в storage, stat)."""
+    stack = [os.path.join(settings.MEDIA_ROOT, directory)]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                name = os.path.relpath(entry.path, settings.MEDIA_ROOT)
+                yield name.replace(os.sep, '/'), entry.stat()
+
+
+def kvstore_rows(identity, chunk_size):
+    return KVStore.objects.filter(
+        key__startswith=add_prefix('', identity)
+    ).values_list('key', 'value').iterator(chunk_size=chunk_size)
+
+
+def referenced_thumbnails(sources, chunk_size):
+    """Имена файлов миниатюр, которые sorl хранит для картинок sources."""
+    source_keys = {source_file(name).key for name in sources}
+    thumbnail_keys = set()
+    for key, value in kvstore_rows('thumbnails', chunk_size):
+        if del_prefix(key) in source_keys:
+            thumbnail_keys.update(deserialize(value))
+    return {
+        deserialize(value)['name']
+        for key, value in kvstore_rows('image', chunk_size)
+        if del_prefix(key) in thumbnail_keys
+    }
+
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки и миниатюры, на которые не ссылается ни один '
+        'пост.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='только показать, что будет удалено',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=1.0,
+            help='пауза между пачками удалений, секунд',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help='не трогать файлы моложе стольких секунд',
+        )
+
+    def handle(self, *args, dry_run=False, batch_size=500, pause=1.0,
+               min_age=3600, **options):
+        self.dry_run = dry_run
+        self.verbosity = options['verbosity']
+        self.pause = pause
+        referenced = set(
+            Post.objects.exclude(image='').values_list(
+                'image', flat=True
+            ).iterator(chunk_size=batch_size)
+        )
+        thumbnails = referenced_thumbnails(referenced, batch_size)
+        cutoff = time.time() - min_age
+        originals = self.collect(
+            walk_files(IMAGES_DIRECTORY), referenced, cutoff, batch_size,
+            self.delete_originals,
+        )
+        orphan_thumbnails = self.collect(
+            walk_files(thumbnail_settings.THUMBNAIL_PREFIX), thumbnails,
+            cutoff, batch_size, self.delete_thumbnails,
+        )
+        action = 'Будет удалено' if dry_run else 'Удалено'
+        for title, (count, size) in (('картинок', originals),
+                                     ('миниатюр', orphan_thumbnails)):
+            self.stdout.write(f'{action} {title}: {count}, байт: {size}')
+
+    def collect(self, files, referenced, cutoff, batch_size, delete):
+        orphans = (
+            (name, stat.st_size) for name, stat in files
+            if name not in referenced and stat.st_mtime < cutoff
+        )
+        count = size = 0
+        for batch in batches(orphans, batch_size):
+            if self.dry_run:
+                if self.verbosity >= 2:
+                    self.stdout.write('\n'.join(name for name, _ in batch))
+            else:
+                batch = delete(batch)
+                time.sleep(self.pause)
+            count += len(batch)
+            size += sum(file_size for _, file_size in batch)
+        return count, size
+
+    def delete_originals(self, batch):
+        # Пост мог сослаться на файл уже после того, как мы собрали ссылки.
+        used = set(Post.objects.filter(
+            image__in=[name for name, _ in batch]
+        ).values_list('image', flat=True))
+        batch = [(name, size) for name, size in batch if name not in used]
+        for name, _ in batch:
+            delete_image(name)
+        MediaFile.objects.filter(name__in=[name for name, _ in batch]).delete()
+        return batch
+
+    def delete_thumbnails(self, batch):
+        for name, _ in batch:
+            default.storage.delete(name)
+        return batch
@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Max
+
+from posts.models import AuthorStats, Group, GroupStats, Post, User
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает или проверяет счётчики постов авторов и групп.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='только сообщить о расхождениях, ничего не записывая',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, verify=False, batch_size=500, **options):
+        mismatches = 0
+        for owner_model, stats_model in ((User, AuthorStats),
+                                         (Group, GroupStats)):
+            mismatches += self.process(
+                owner_model, stats_model, batch_size, verify
+            )
+        if verify and mismatches:
+            raise CommandError(f'Расхождений: {mismatches}')
+        self.stdout.write(f'Готово, расхождений: {mismatches}')
+
+    def process(self, owner_model, stats_model, batch_size, verify):
+        mismatches = 0
+        last_pk = 0
+        while True:
+            owner_ids = list(
+                owner_model.objects.filter(pk__gt=last_pk).order_by(
+                    'pk'
+                ).values_list('pk', flat=True)[:batch_size]
+            )
+            if not owner_ids:
+                return mismatches
+            last_pk = owner_ids[-1]
+            mismatches += self.process_batch(stats_model, owner_ids, verify)
+
+    def process_batch(self, stats_model, owner_ids, verify):
+        owner_field = f'{stats_model.owner_field}_id'
+        actual = {
+            row[owner_field]: (row['posts_count'], row['last_pub_date'])
+            for row in Post.objects.filter(
+                **{f'{owner_field}__in': owner_ids}
+            ).order_by().values(owner_field).annotate(
+                posts_count=Count('pk'),
+                last_pub_date=Max('pub_date'),
+            )
+        }
+        stored = {
+            stats.pk: stats
+            for stats in stats_model.objects.filter(pk__in=owner_ids)
+        }
+        to_create, to_update = [], []
+        for owner_id in owner_ids:
+            posts_count, last_pub_date = actual.get(owner_id, (0, None))
+            stats = stored.get(owner_id)
+            if stats is None:
+                if posts_count:
+                    to_create.append(stats_model(
+                        pk=owner_id,
+                        posts_count=posts_count,
+                        last_pub_date=last_pub_date,
+                    ))
+                continue
+            if (stats.posts_count, stats.last_pub_date) != (
+                    posts_count, last_pub_date):
+                stats.posts_count = posts_count
+                stats.last_pub_date = last_pub_date
+                to_update.append(stats)
+        if verify:
+            for stats in to_create + to_update:
+                self.stdout.write(
+                    f'{stats_model.__name__} {stats.pk}: '
+                    f'ожидается {stats.posts_count}'
+                )
+        else:
+            with transaction.atomic():
+                stats_model.objects.bulk_create(to_create)
+                stats_model.objects.bulk_update(
+                    to_update, ['posts_count', 'last_pub_date']
+                )
+        return len(to_create) + len(to_update)
@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts.cache import bump_versions, post_feeds
+from posts.models import ImageIngest, MediaFile, Post
+from posts.storage import SHARDED_NAME, image_storage
+from posts.thumbnails import delete_image, enqueue_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в каталоги posts/ab/cd/ и переписывает '
+        'пути в базе пачками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--delete-old',
+            action='store_true',
+            help='удалить старые файлы и их миниатюры после переноса',
+        )
+
+    def handle(self, *args, batch_size=500, delete_old=False, **options):
+        moved = 0
+        last_pk = 0
+        while True:
+            posts = list(
+                Post.objects.filter(pk__gt=last_pk).exclude(
+                    image=''
+                ).exclude(image__regex=SHARDED_NAME).order_by(
+                    'pk'
+                ).values_list('pk', 'image')[:batch_size]
+            )
+            if not posts:
+                break
+            last_pk = posts[-1][0]
+            moved += self.process_batch(posts, delete_old)
+        self.stdout.write(f'Готово, перенесено файлов: {moved}')
+
+    def process_batch(self, posts, delete_old):
+        renames = {}
+        for name in {name for _, name in posts}:
+            new_name = self.copy(name)
+            if new_name is not None:
+                renames[name] = new_name
+        with transaction.atomic():
+            for old_name, new_name in renames.items():
+                self.rename(old_name, new_name)
+        # Закешированные страницы и карточки ссылаются на старые пути.
+        bump_versions({
+            feed
+            for post in Post.objects.filter(
+                pk__in=[pk for pk, _ in posts]
+            ).select_related('author', 'group')
+            for feed in post_feeds(post)
+        })
+        for old_name, new_name in renames.items():
+            enqueue_thumbnails(new_name)
+            if delete_old:
+                delete_image(old_name)
+        return len(renames)
+
+    def copy(self, name):
+        if not image_storage.exists(name):
+            self.stderr.write(f'Нет файла {name}, пропускаю')
+            return None
+        with image_storage.open(name) as content:
+            return image_storage.save(name, content)
+
+    def rename(self, old_name, new_name):
+        Post.objects.filter(image=old_name).update(
+            image=new_name, updated_at=timezone.now()
+        )
+        MediaFile.rename(old_name, new_name)
+        # Ссылка, которую взяло хранилище при копировании, уже учтена
+        # в перенесённых ссылках старого файла.
+        MediaFile.release(new_name)
+        if ImageIngest.objects.filter(name=new_name).exists():
+            ImageIngest.objects.filter(name=old_name).delete()
+        else:
+            ImageIngest.objects.filter(name=old_name).update(name=new_name)
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageIngest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('original_bytes', models.PositiveIntegerField(verbose_name='Байт в оригинале')),
+                ('stored_bytes', models.PositiveIntegerField(verbose_name='Байт после обработки')),
+                ('original_width', models.PositiveIntegerField(verbose_name='Ширина оригинала')),
+                ('original_height', models.PositiveIntegerField(verbose_name='Высота оригинала')),
+                ('width', models.PositiveIntegerField(verbose_name='Ширина')),
+                ('height', models.PositiveIntegerField(verbose_name='Высота')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата обработки')),
+            ],
+            options={
+                'verbose_name': 'Обработка картинки',
+                'verbose_name_plural': 'Обработка картинок',
+            },
+        ),
+    ]
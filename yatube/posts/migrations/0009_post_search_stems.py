@@ -0,0 +1,45 @@
+from importlib import import_module
+
+from django.db import migrations
+
+post_search = import_module('posts.migrations.0008_post_search')
+
+# Индекс без своей копии текста (content=''): в нём основы слов, а не
+# текст posts_post, и 'rebuild' по таблице постов дал бы другой индекс.
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+    "text, content='', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts(rowid, text) "
+    "VALUES (new.id, posts_stem(new.text)); "
+    "END",
+    "CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts(posts_post_fts, rowid, text) "
+    "VALUES ('delete', old.id, posts_stem(old.text)); "
+    "END",
+    "CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF text "
+    "ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts(posts_post_fts, rowid, text) "
+    "VALUES ('delete', old.id, posts_stem(old.text)); "
+    "INSERT INTO posts_post_fts(rowid, text) "
+    "VALUES (new.id, posts_stem(new.text)); "
+    "END",
+    "INSERT INTO posts_post_fts(rowid, text) "
+    "SELECT id, posts_stem(text) FROM posts_post",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_post_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            post_search.run_sqlite(post_search.DROP_SQL + CREATE_SQL),
+            post_search.run_sqlite(
+                post_search.DROP_SQL + post_search.CREATE_SQL
+            ),
+        ),
+    ]
@@ -1,6 +1,10 @@
 from django.db import models
+from django.db.models import Case, Count, F, Max, OuterRef, Q, Subquery, When
+from django.db.models.functions import Greatest
 from django.contrib.auth import get_user_model
 
+from .storage import image_storage
+
 User = get_user_model()
 
 
@@ -17,9 +21,31 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Посты для лент: автор и группа одним JOIN, только нужные поля."""
+        return self.select_related('author', 'group').only(
+            'text',
+            'pub_date',
+            'updated_at',
+            'image',
+            'author',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'group',
+            'group__slug',
+            'group__title',
+        )
+
+    def detail(self):
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -35,11 +61,183 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=image_storage,
         blank=True
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['pub_date', 'id'],
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', 'pub_date', 'id'],
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', 'pub_date', 'id'],
+                name='post_author_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
+
+
+class PostStats(models.Model):
+    """Денормализованные счётчики постов владельца (автора или группы).
+
+    Поддерживаются сигналами posts.signals, пересчитываются командой
+    ``manage.py post_stats``.
+    """
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    last_pub_date = models.DateTimeField(
+        'Последняя публикация',
+        null=True,
+        blank=True
+    )
+
+    owner_field = None
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def owner_posts(cls, owner_id):
+        return Post.objects.filter(**{f'{cls.owner_field}_id': owner_id})
+
+    @classmethod
+    def recount(cls, owner_id):
+        stats = cls.owner_posts(owner_id).aggregate(
+            posts_count=Count('pk'),
+            last_pub_date=Max('pub_date'),
+        )
+        return cls.objects.update_or_create(pk=owner_id, defaults=stats)[0]
+
+    @classmethod
+    def posts_count_for(cls, owner_id):
+        posts_count = cls.objects.filter(pk=owner_id).values_list(
+            'posts_count', flat=True
+        ).first()
+        if posts_count is None:
+            # Строку создадут сигналы или команда post_stats.
+            posts_count = cls.owner_posts(owner_id).count()
+        return posts_count
+
+    @classmethod
+    def post_added(cls, owner_id, pub_date):
+        updated = cls.objects.filter(pk=owner_id).update(
+            posts_count=F('posts_count') + 1,
+            last_pub_date=Case(
+                When(
+                    Q(last_pub_date__lt=pub_date)
+                    | Q(last_pub_date__isnull=True),
+                    then=pub_date,
+                ),
+                default=F('last_pub_date'),
+            ),
+        )
+        if not updated:
+            cls.recount(owner_id)
+
+    @classmethod
+    def post_removed(cls, owner_id):
+        # Строки может уже не быть, если владелец удаляется каскадом.
+        latest = cls.owner_posts(OuterRef('pk')).order_by(
+            '-pub_date'
+        ).values('pub_date')[:1]
+        cls.objects.filter(pk=owner_id, posts_count__gt=0).update(
+            posts_count=F('posts_count') - 1,
+            last_pub_date=Subquery(latest),
+        )
+
+
+class AuthorStats(PostStats):
+    author = models.OneToOneField(
+        User,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='post_stats'
+    )
+
+    owner_field = 'author'
+
+
+class GroupStats(PostStats):
+    group = models.OneToOneField(
+        Group,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='post_stats'
+    )
+
+    owner_field = 'group'
+
+
+class ImageIngest(models.Model):
+    """Размеры картинки до и после нормализации при загрузке."""
+    name = models.CharField('Файл', max_length=255, unique=True)
+    original_bytes = models.PositiveIntegerField('Байт в оригинале')
+    stored_bytes = models.PositiveIntegerField('Байт после обработки')
+    original_width = models.PositiveIntegerField('Ширина оригинала')
+    original_height = models.PositiveIntegerField('Высота оригинала')
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+    created = models.DateTimeField('Дата обработки', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Обработка картинки'
+        verbose_name_plural = 'Обработка картинок'
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def saved_bytes(self):
+        return self.original_bytes - self.stored_bytes
+
+
+class MediaFile(models.Model):
+    """Сколько постов ссылается на файл картинки (posts.storage)."""
+    name = models.CharField('Файл', max_length=255, unique=True)
+    references = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def acquire(cls, name):
+        updated = cls.objects.filter(name=name).update(
+            references=F('references') + 1
+        )
+        if not updated:
+            cls.objects.create(name=name, references=1)
+
+    @classmethod
+    def rename(cls, old_name, new_name):
+        """Переносит ссылки с файла old_name на new_name."""
+        references = cls.objects.filter(name=old_name).values_list(
+            'references', flat=True
+        ).first()
+        if references is None:
+            return
+        cls.objects.filter(name=old_name).delete()
+        updated = cls.objects.filter(name=new_name).update(
+            references=F('references') + references
+        )
+        if not updated:
+            cls.objects.create(name=new_name, references=references)
+
+    @classmethod
+    def release(cls, name, references=1):
+        cls.objects.filter(name=name, references__gt=0).update(
+            references=Greatest(F('references') - references, 0)
+        )
@@ -0,0 +1,277 @@
+import base64
+import binascii
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .cache import COUNT_TIMEOUT
+
+# Самая глубокая страница, которую ещё можно открыть старой ссылкой
+# ?page=N: дальше OFFSET становится слишком дорогим.
+LEGACY_PAGE_LIMIT = 50
+LAST_PAGE = 'last'
+
+
+def estimated_count_key(key):
+    return f'{key}:estimated'
+
+
+def make_cursor(pub_date, pk, number):
+    raw = f'{pub_date.isoformat()}|{pk}|{number}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def encode_cursor(post, number):
+    return make_cursor(post.pub_date, post.pk, number)
+
+
+def decode_cursor(token):
+    """Возвращает (pub_date, pk, number) или None для битого курсора."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        pub_date, pk, number = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk, number = int(pk), int(number)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if pub_date is None or number < 1:
+        return None
+    return pub_date, pk, number
+
+
+def after_cursor(queryset, pub_date, pk):
+    """Посты старше (pub_date, pk) в порядке ленты."""
+    return queryset.filter(
+        Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk),
+        pub_date__lte=pub_date,
+    )
+
+
+class KeysetPage(Page):
+    def __init__(self, object_list, number, paginator,
+                 has_next=None, has_previous=None):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def has_next(self):
+        if self._has_next is None:
+            return super().has_next()
+        return self._has_next
+
+    def has_previous(self):
+        if self._has_previous is None:
+            return super().has_previous()
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self.has_next() or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[-1], self.number + 1)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous() or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[0], max(self.number - 1, 1))
+
+    @property
+    def elided_page_range(self):
+        return self.paginator.get_elided_page_range(self.number)
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берёт число объектов из кеша.
+
+    Счётчик лежит под ключом count_key и поддерживается сигналами
+    posts.signals. При estimate_above точный COUNT не считается дальше
+    порога: count ограничивается значением estimate_above + 1, а
+    count_is_estimated становится True. Такая оценка кешируется под
+    отдельным ключом: сигналы её не трогают, иначе после нескольких
+    удалений она сошла бы за точное число.
+    """
+
+    def __init__(self, object_list, per_page, count_key=None,
+                 estimate_above=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+        self.estimate_above = estimate_above
+        self.estimated = False
+
+    @cached_property
+    def count(self):
+        if self.count_key is None:
+            return self._count()
+        estimate_key = estimated_count_key(self.count_key)
+        cached = cache.get_many([self.count_key, estimate_key])
+        if self.count_key in cached:
+            return cached[self.count_key]
+        if estimate_key in cached:
+            self.estimated = True
+            return cached[estimate_key]
+        count = self._count()
+        if self.estimated:
+            cache.set(estimate_key, count, COUNT_TIMEOUT)
+        else:
+            cache.add(self.count_key, count, COUNT_TIMEOUT)
+        return count
+
+    @property
+    def count_is_estimated(self):
+        count = self.count
+        return self.estimated or (
+            self.estimate_above is not None and count > self.estimate_above
+        )
+
+    def _count(self):
+        queryset = self.object_list.order_by()
+        if self.estimate_above is None:
+            return queryset.count()
+        count = queryset.values('pk')[:self.estimate_above + 1].count()
+        self.estimated = count > self.estimate_above
+        return count
+
+
+class KeysetPaginator(CachedCountPaginator):
+    """Пагинатор по ключу (pub_date, pk).
+
+    Переход по курсорам ?after=/?before= стоит одного поиска по индексу
+    независимо от глубины страницы. Старые ссылки ?page=N обслуживаются
+    через OFFSET от ближайшего конца ленты, но не дальше LEGACY_PAGE_LIMIT
+    страниц от него.
+    """
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, **kwargs):
+        super().__init__(
+            object_list.order_by('-pub_date', '-pk'), per_page, **kwargs
+        )
+
+    def is_reachable(self, number):
+        """Можно ли дёшево открыть страницу ссылкой ?page=N."""
+        if number <= LEGACY_PAGE_LIMIT:
+            return True
+        return (
+            not self.count_is_estimated
+            and self.num_pages - number < LEGACY_PAGE_LIMIT
+        )
+
+    def get_elided_page_range(self, number=1, on_each_side=2, on_ends=1):
+        """Номера страниц вокруг текущей с многоточиями на месте пропусков.
+
+        Размер вывода не зависит от длины ленты; недоступные по ?page=N
+        номера тоже заменяются многоточием.
+        """
+        number = min(max(number, 1), self.num_pages)
+        pages = []
+        for page_number in self._window(number, on_each_side, on_ends):
+            if page_number != number and (
+                    page_number == self.ELLIPSIS
+                    or not self.is_reachable(page_number)):
+                page_number = self.ELLIPSIS
+                if pages and pages[-1] == self.ELLIPSIS:
+                    continue
+            pages.append(page_number)
+        return pages
+
+    def _window(self, number, on_each_side, on_ends):
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > on_each_side + on_ends + 2:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+    def get_cursor_page(self, query):
+        """Страница по параметрам запроса (request.GET)."""
+        for param, forward in (('after', True), ('before', False)):
+            cursor = decode_cursor(query.get(param, ''))
+            if cursor is not None:
+                return self._seek(cursor, forward)
+        page_number = query.get('page')
+        if page_number == LAST_PAGE:
+            return self._last_page()
+        try:
+            page_number = int(page_number)
+        except (TypeError, ValueError):
+            page_number = 1
+        if page_number <= 1:
+            return self._first_page()
+        if page_number <= LEGACY_PAGE_LIMIT:
+            return self.get_page(page_number)
+        if self.is_reachable(page_number):
+            return self._tail_page(min(page_number, self.num_pages))
+        return self.get_page(LEGACY_PAGE_LIMIT)
+
+    def _get_page(self, *args, **kwargs):
+        return KeysetPage(*args, **kwargs)
+
+    def _first_page(self):
+        rows = list(self.object_list[:self.per_page + 1])
+        return KeysetPage(
+            rows[:self.per_page], 1, self,
+            has_next=len(rows) > self.per_page, has_previous=False,
+        )
+
+    def _last_page(self):
+        if self.count <= self.per_page:
+            return self._first_page()
+        if self.count_is_estimated:
+            rows = list(self.object_list.reverse()[:self.per_page])
+            rows.reverse()
+            return KeysetPage(
+                rows, self.num_pages, self, has_next=False, has_previous=True
+            )
+        return self._tail_page(self.num_pages)
+
+    def _tail_page(self, number):
+        """Страница, отсчитанная с конца ленты: OFFSET в обратном порядке."""
+        start = (number - 1) * self.per_page
+        end = min(number * self.per_page, self.count)
+        rows = list(
+            self.object_list.reverse()[self.count - end:self.count - start]
+        )
+        rows.reverse()
+        return KeysetPage(
+            rows, number, self,
+            has_next=number < self.num_pages, has_previous=number > 1,
+        )
+
+    def _seek(self, cursor, forward):
+        pub_date, pk, number = cursor
+        if forward:
+            queryset = after_cursor(self.object_list, pub_date, pk)
+        else:
+            queryset = self.object_list.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk),
+                pub_date__gte=pub_date,
+            ).reverse()
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            if not rows:
+                return self._last_page()
+            return KeysetPage(
+                rows, number, self, has_next=more, has_previous=True
+            )
+        if not more:
+            return self._first_page()
+        rows.reverse()
+        return KeysetPage(
+            rows, max(number, 2), self, has_next=True, has_previous=True
+        )
@@ -0,0 +1,200 @@
+"""Кеширование страниц постов на обратном прокси и их сброс по ключам.
+
+Анонимные ответы лент и постов помечаются Cache-Control: public
+с s-maxage и заголовком Surrogate-Key (index, group-<slug>,
+author-<username>, post-<id>). Когда пост сохраняют или удаляют, ключи
+копятся до конца запроса (PurgeMiddleware) и уходят в прокси одним
+сбросом пачками по POSTS_PURGER['OPTIONS']['batch_size']. Вне запроса,
+например в командах, ключи уходят после коммита каждой транзакции, если
+код не обёрнут в collect_purges().
+
+Чем сбрасывать, задаёт POSTS_PURGER: HttpPurger шлёт POST на адрес
+прокси (Fastly, Varnish с xkey), LocalPurger только запоминает ключи —
+для разработки и тестов.
+"""
+import contextlib
+import functools
+import logging
+import threading
+import urllib.error
+import urllib.request
+from collections import deque
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.cache import patch_cache_control
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+INDEX_KEY = 'index'
+
+_pending = threading.local()
+
+
+def feed_key(feed):
+    """Ключ для ленты из posts.cache: 'group:cats' → 'group-cats'."""
+    return feed.replace(':', '-')
+
+
+def group_key(slug):
+    return f'group-{slug}'
+
+
+def author_key(username):
+    return f'author-{username}'
+
+
+def post_key(post_id):
+    return f'post-{post_id}'
+
+
+def batches(keys, size):
+    keys = sorted(keys)
+    for start in range(0, len(keys), size):
+        yield keys[start:start + size]
+
+
+class BasePurger:
+    def __init__(self, batch_size=256):
+        self.batch_size = batch_size
+
+    def purge(self, keys):
+        for batch in batches(keys, self.batch_size):
+            self.send(batch)
+
+    def send(self, keys):
+        raise NotImplementedError
+
+
+class HttpPurger(BasePurger):
+    """Один POST с заголовком Surrogate-Key на каждую пачку ключей."""
+
+    def __init__(self, endpoint, headers=None, timeout=5, **kwargs):
+        super().__init__(**kwargs)
+        self.endpoint = endpoint
+        self.headers = headers or {}
+        self.timeout = timeout
+
+    def send(self, keys):
+        request = urllib.request.Request(
+            self.endpoint,
+            method='POST',
+            headers={**self.headers, 'Surrogate-Key': ' '.join(keys)},
+        )
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except (urllib.error.URLError, OSError) as error:
+            # Запись поста уже прошла; в худшем случае страница устареет
+            # на s-maxage.
+            logger.error('Не удалось сбросить кеш прокси: %s', error)
+
+
+class LocalPurger(BasePurger):
+    """Запоминает отправленные пачки ключей вместо запросов к прокси."""
+
+    def __init__(self, max_batches=1000, **kwargs):
+        super().__init__(**kwargs)
+        self.sent = deque(maxlen=max_batches)
+
+    def send(self, keys):
+        self.sent.append(keys)
+
+    @property
+    def purged(self):
+        return {key for batch in self.sent for key in batch}
+
+    def clear(self):
+        self.sent.clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_purger():
+    config = settings.POSTS_PURGER
+    return import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def reset_purger(setting, **kwargs):
+    if setting == 'POSTS_PURGER':
+        get_purger.cache_clear()
+
+
+def flush_purges():
+    keys = getattr(_pending, 'keys', None)
+    _pending.keys = set()
+    if keys:
+        get_purger().purge(keys)
+
+
+def purge_later(keys):
+    """Сбрасывает ключи в конце collect_purges() или после коммита.
+
+    Без ATOMIC_REQUESTS каждая запись коммитится сразу, поэтому внутри
+    запроса ключи ждут конца collect_purges(). Если транзакцию откатили,
+    её ключи всё равно уйдут: лишний сброс безвреден.
+    """
+    if not hasattr(_pending, 'keys'):
+        _pending.keys = set()
+    _pending.keys.update(keys)
+    if not getattr(_pending, 'depth', 0):
+        transaction.on_commit(flush_purges)
+
+
+@contextlib.contextmanager
+def collect_purges():
+    """Копит ключи purge_later() до выхода из блока, затем один сброс."""
+    depth = getattr(_pending, 'depth', 0)
+    _pending.depth = depth + 1
+    try:
+        yield
+    finally:
+        _pending.depth = depth
+        if not depth:
+            if transaction.get_connection().in_atomic_block:
+                transaction.on_commit(flush_purges)
+            else:
+                flush_purges()
+
+
+class PurgeMiddleware:
+    """Отправляет ключи, накопленные за запрос, после ответа view."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collect_purges():
+            return self.get_response(request)
+
+
+def cache_at_edge(get_keys):
+    """Разрешает прокси кешировать анонимный ответ view под ключами.
+
+    get_keys получает request и аргументы view. Браузеру ответ всегда
+    приходится перепроверять (max-age=0), зато это дешёвый 304.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if (request.method in ('GET', 'HEAD')
+                    and not request.user.is_authenticated
+                    and response.status_code in (200, 304)
+                    and not request.META.get('CSRF_COOKIE_USED')):
+                patch_cache_control(
+                    response,
+                    public=True,
+                    max_age=0,
+                    s_maxage=settings.POSTS_EDGE_MAX_AGE,
+                )
+                response['Surrogate-Key'] = ' '.join(
+                    get_keys(request, *args, **kwargs)
+                )
+            else:
+                patch_cache_control(response, private=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,77 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Морфологии в SQLite нет, поэтому у слов отрезаются типичные русские
+окончания, а «ё» заменяется на «е». Так делается и с запросом, и с
+текстом постов: индекс posts_post_fts (миграция 0009_post_search_stems)
+хранит основы, которые триггеры получают SQL-функцией posts_stem.
+Основы сравниваются целиком: «котами» находит «кот» и «коты», но не
+«который» и не «котлеты». Результаты упорядочены по bm25.
+
+posts_stem регистрируется на каждом соединении Django с SQLite
+(posts.signals); если поменять stem(), индекс нужно перестроить.
+"""
+import re
+
+from django.db import connection
+
+FTS_TABLE = 'posts_post_fts'
+MIN_STEM_LENGTH = 3
+WORD_RE = re.compile(r'\w+')
+# Окончания от длинных к коротким, чтобы отрезалось самое длинное.
+ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ость', 'ости', 'ение', 'ения', 'ению', 'ением', 'ений',
+    'ать', 'ять', 'ить', 'еть', 'ешь', 'ете', 'ишь', 'ите', 'ует', 'уют',
+    'ают', 'яют', 'ла', 'ли', 'ло',
+    'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие',
+    'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'ов', 'ев', 'ью',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+
+
+def stem(word):
+    for ending in ENDINGS:
+        if (word.endswith(ending)
+                and len(word) - len(ending) >= MIN_STEM_LENGTH):
+            return word[:-len(ending)]
+    return word
+
+
+def stems(text):
+    return [
+        stem(word) for word in WORD_RE.findall(text.lower().replace('ё', 'е'))
+    ]
+
+
+def stem_text(text):
+    """Текст поста в том виде, в каком он лежит в индексе."""
+    return ' '.join(stems(text or ''))
+
+
+def register_functions(connection):
+    connection.connection.create_function(
+        'posts_stem', 1, stem_text, deterministic=True
+    )
+
+
+def match_expression(query):
+    """Запрос пользователя в синтаксисе MATCH; '' — искать нечего."""
+    return ' '.join(f'"{word}"' for word in stems(query))
+
+
+def search_posts(queryset, query):
+    """Посты queryset, подходящие под query, от самых релевантных."""
+    match = match_expression(query)
+    if not match:
+        return queryset.none()
+    if connection.vendor != 'sqlite':
+        return queryset.filter(text__icontains=query)
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[
+            f'{FTS_TABLE}.rowid = posts_post.id',
+            f'{FTS_TABLE} MATCH %s',
+        ],
+        params=[match],
+        select={'rank': f'bm25({FTS_TABLE})'},
+    ).order_by('rank', '-pub_date')
@@ -0,0 +1,182 @@
+import contextlib
+import threading
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .cache import (author_feeds, bump_versions, change_counts, group_feed,
+                    group_feeds, group_post_feeds, post_feeds)
+from .models import AuthorStats, Group, GroupStats, MediaFile, Post
+from .purge import post_key, purge_later
+from .search import register_functions
+from .thumbnails import delete_image
+
+
+_bulk = threading.local()
+
+
+@contextlib.contextmanager
+def bulk_changes():
+    """Внутри блока post_deleted не трогает счётчики, картинки и кеш.
+
+    posts.bulk пересчитывает их сам, один раз на всё действие.
+    """
+    previous = getattr(_bulk, 'active', False)
+    _bulk.active = True
+    try:
+        yield
+    finally:
+        _bulk.active = previous
+
+
+@receiver(connection_created)
+def add_search_functions(sender, connection, **kwargs):
+    # Триггеры поискового индекса зовут posts_stem (posts.search).
+    if connection.vendor == 'sqlite':
+        register_functions(connection)
+
+
+def delete_unused_image(name):
+    # Пока транзакция открыта, acquire() того же файла в хранилище ждёт её.
+    with transaction.atomic():
+        if MediaFile.objects.filter(name=name, references=0).delete()[0]:
+            delete_image(name)
+
+
+def replace_image(previous, current, acquired=False):
+    """Переносит ссылку поста с файла previous на файл current.
+
+    acquired — ссылку на current уже взяло хранилище при загрузке.
+    """
+    if previous == current:
+        if acquired:
+            MediaFile.release(current)
+        return
+    if current and not acquired:
+        MediaFile.acquire(current)
+    if previous:
+        MediaFile.release(previous)
+        transaction.on_commit(lambda: delete_unused_image(previous))
+
+
+def move_post(stats, feeds, previous_id, current_id, pub_date):
+    """Переносит пост от одного владельца (группы, автора) к другому."""
+    if previous_id == current_id:
+        return
+    with transaction.atomic():
+        if previous_id:
+            stats.post_removed(previous_id)
+        if current_id:
+            stats.post_added(current_id, pub_date)
+    if previous_id:
+        change_counts(feeds(previous_id), -1)
+        bump_versions(feeds(previous_id))
+    if current_id:
+        change_counts(feeds(current_id), 1)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_state(sender, instance, raw, **kwargs):
+    instance._previous_author_id = None
+    instance._previous_group_id = None
+    instance._previous_image = ''
+    # Незакоммиченный файл запишет хранилище, взяв на него ссылку.
+    instance._image_uploaded = not instance.image._committed
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    previous = Post.objects.filter(
+        pk=instance.pk
+    ).values_list('author_id', 'group_id', 'image').first()
+    if previous is not None:
+        (instance._previous_author_id, instance._previous_group_id,
+         instance._previous_image) = previous
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        with transaction.atomic():
+            AuthorStats.post_added(instance.author_id, instance.pub_date)
+            if instance.group_id:
+                GroupStats.post_added(instance.group_id, instance.pub_date)
+            replace_image(
+                '', instance.image.name,
+                getattr(instance, '_image_uploaded', False),
+            )
+        change_counts(post_feeds(instance), 1)
+        bump_versions(post_feeds(instance))
+        return
+    purge_later([post_key(instance.pk)])
+    replace_image(
+        getattr(instance, '_previous_image', ''), instance.image.name,
+        getattr(instance, '_image_uploaded', False),
+    )
+    move_post(
+        AuthorStats, author_feeds,
+        getattr(instance, '_previous_author_id', None) or instance.author_id,
+        instance.author_id, instance.pub_date,
+    )
+    move_post(
+        GroupStats, group_feeds,
+        getattr(instance, '_previous_group_id', None), instance.group_id,
+        instance.pub_date,
+    )
+    # Кеш трогаем после записи счётчиков: иначе параллельный запрос
+    # успеет закешировать страницу со старыми данными под новой версией.
+    bump_versions(post_feeds(instance))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    if getattr(_bulk, 'active', False):
+        return
+    with transaction.atomic():
+        AuthorStats.post_removed(instance.author_id)
+        if instance.group_id:
+            GroupStats.post_removed(instance.group_id)
+        replace_image(instance.image.name, '')
+    change_counts(post_feeds(instance), -1)
+    bump_versions(post_feeds(instance))
+    purge_later([post_key(instance.pk)])
+
+
+@receiver(pre_save, sender=Group)
+def remember_previous_slug(sender, instance, raw, **kwargs):
+    instance._previous_slug = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._previous_slug = Group.objects.filter(
+        pk=instance.pk
+    ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    feeds = {group_feed(instance.slug)}
+    previous_slug = getattr(instance, '_previous_slug', None)
+    if previous_slug and previous_slug != instance.slug:
+        # Под старым адресом не должна остаться закешированная лента,
+        # а карточки постов группы ссылаются на новый адрес.
+        feeds.add(group_feed(previous_slug))
+        feeds.update(group_post_feeds(instance.pk))
+    bump_versions(feeds)
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_feeds(sender, instance, **kwargs):
+    # Посты теряют группу одним UPDATE (SET_NULL), их сигналы не шлются.
+    instance._post_feeds = group_post_feeds(instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    bump_versions([
+        group_feed(instance.slug), *getattr(instance, '_post_feeds', ()),
+    ])
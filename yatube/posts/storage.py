@@ -0,0 +1,55 @@
+"""Хранилище картинок постов с именами по содержимому.
+
+Файл называется sha256 своего содержимого, поэтому повторная загрузка той
+же картинки не пишет на диск ничего нового, а все посты ссылаются на один
+файл. Миниатюры sorl строятся по имени исходника и тоже общие. Сколько
+постов ссылается на файл, хранит MediaFile; файл удаляется вместе с
+последней ссылкой. Ссылку на загруженный файл берёт само хранилище, до
+проверки exists(): иначе файл, найденный на диске, мог бы удалить
+параллельный delete_unused_image, пока пост ещё не сохранён.
+
+Файлы раскладываются по двум уровням каталогов по первым символам хеша
+(posts/ab/cd/abcd….jpg), чтобы в одном каталоге не копились миллионы
+записей. Миниатюры sorl раскладываются так же (cache/ab/cd/…). Старые
+плоские пути переносит команда ``manage.py shard_media``.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+# Имя в разложенном по каталогам виде: posts/ab/cd/<sha256>.<ext>.
+SHARDED_NAME = r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.'
+
+
+def shard_path(directory, filename):
+    return os.path.join(directory, filename[:2], filename[2:4], filename)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return shard_path(directory, digest.hexdigest() + extension)
+
+    def _save(self, name, content):
+        from .models import MediaFile
+
+        name = self.content_name(name, content)
+        # delete_unused_image удаляет строку и файл в одной транзакции:
+        # после acquire() файл либо не тронут, либо уже удалён и будет
+        # записан заново.
+        MediaFile.acquire(name)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+image_storage = ContentAddressedStorage()
@@ -0,0 +1,42 @@
+from django import template
+from django.conf import settings
+
+from posts.thumbnails import MIME_TYPES, enqueue_thumbnails, ready_variants
+
+register = template.Library()
+
+
+@register.filter
+def picture_version(image):
+    """Число готовых вариантов картинки — часть ключа кеша карточки."""
+    if not image:
+        return 0
+    return sum(len(variants) for variants in ready_variants(image).values())
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(image, sizes='100vw', css_class='card-img my-2'):
+    """<picture> с вариантами картинки из POSTS_IMAGE_VARIANTS.
+
+    В srcset попадают только готовые варианты; пока их нет, отдаётся
+    оригинал.
+    """
+    sources = []
+    src = image.url
+    for image_format, variants in ready_variants(image).items():
+        sources.append({
+            'type': MIME_TYPES[image_format],
+            'srcset': ', '.join(
+                f'{thumbnail.url} {width}w' for thumbnail, width in variants
+            ),
+        })
+        if image_format == 'JPEG':
+            src = variants[-1][0].url
+    if not sources and settings.POSTS_THUMBNAIL_WORKERS:
+        enqueue_thumbnails(image.name)
+    return {
+        'sources': sources,
+        'src': src,
+        'sizes': sizes,
+        'css_class': css_class,
+    }
@@ -0,0 +1,121 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import AuthorStats, Group, GroupStats, MediaFile, Post
+
+User = get_user_model()
+
+
+class PostAdminActionsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.author = User.objects.create_user(username='test_author')
+        cls.other = User.objects.create_user(username='other_author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-group', description='-'
+        )
+        for number in range(5):
+            Post.objects.create(author=cls.author, text=f'Пост {number}')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:posts_post_changelist')
+
+    def run_action(self, action, **data):
+        return self.client.post(self.url, {
+            'action': action,
+            '_selected_action': list(
+                Post.objects.values_list('pk', flat=True)
+            ),
+            **data,
+        })
+
+    def test_move_to_group_updates_in_chunks(self):
+        """одна пачка — один UPDATE, счётчики группы пересчитаны."""
+        with mock.patch('posts.bulk.BULK_CHUNK_SIZE', 2), \
+                CaptureQueriesContext(connection) as queries:
+            self.run_action('move_to_group', group=self.group.pk)
+        updates = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "posts_post"')
+        ]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(self.group.posts.count(), 5)
+        self.assertEqual(
+            GroupStats.objects.get(pk=self.group.pk).posts_count, 5
+        )
+
+    def test_move_to_group_requires_group(self):
+        Post.objects.update(group=self.group)
+        response = self.run_action('move_to_group', group='')
+        self.assertEqual(self.group.posts.count(), 5)
+        self.assertContains(
+            self.client.get(response.url), 'Выберите группу'
+        )
+        self.run_action('remove_from_group')
+        self.assertFalse(self.group.posts.exists())
+        self.assertEqual(
+            GroupStats.objects.get(pk=self.group.pk).posts_count, 0
+        )
+
+    def test_reassign_author(self):
+        self.run_action('reassign_author', author='other_author')
+        self.assertEqual(self.other.posts.count(), 5)
+        self.assertEqual(
+            AuthorStats.objects.get(pk=self.other.pk).posts_count, 5
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(pk=self.author.pk).posts_count, 0
+        )
+
+    def test_unknown_author_changes_nothing(self):
+        self.run_action('reassign_author', author='nobody')
+        self.assertEqual(self.author.posts.count(), 5)
+
+    def test_delete_posts_asks_for_confirmation(self):
+        response = self.run_action('delete_posts')
+        self.assertTemplateUsed(
+            response, 'admin/posts/post/delete_posts_confirmation.html'
+        )
+        self.assertContains(response, 'Будет удалено постов: 5')
+        self.assertContains(response, 'name="post" value="yes"')
+        self.assertEqual(Post.objects.count(), 5)
+
+    def test_delete_posts_releases_images(self):
+        """удаление идёт через Collector, но без работы сигналов на строку."""
+        Post.objects.update(image='posts/shared.gif')
+        MediaFile.objects.create(name='posts/shared.gif', references=5)
+        deleted = mock.Mock()
+        post_delete.connect(deleted, sender=Post)
+        self.addCleanup(post_delete.disconnect, deleted, sender=Post)
+        with mock.patch('posts.signals.change_counts') as change_counts:
+            self.run_action('delete_posts', post='yes')
+        self.assertEqual(deleted.call_count, 5)
+        change_counts.assert_not_called()
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(
+            MediaFile.objects.get(name='posts/shared.gif').references, 0
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(pk=self.author.pk).posts_count, 0
+        )
+
+    def test_changelist_skips_full_count(self):
+        response = self.client.get(self.url)
+        changelist = response.context['cl']
+        self.assertFalse(changelist.show_full_result_count)
+        self.assertEqual(changelist.list_select_related, ('author', 'group'))
+        self.assertNotIn('delete_selected', response.content.decode())
@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class PostsApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-group', description='-'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                text=f'Пост {number}',
+                group=cls.group if number % 2 else None,
+            )
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.index_url = reverse('posts:api_index')
+
+    def walk(self, url):
+        ids = []
+        while url:
+            data = self.client.get(url).json()
+            ids += [post['id'] for post in data['results']]
+            url = data['next']
+        return ids
+
+    def test_cursor_pagination_walks_feed_once(self):
+        expected = [post.id for post in reversed(self.posts)]
+        self.assertEqual(self.walk(self.index_url + '?limit=2'), expected)
+        group_ids = self.walk(reverse(
+            'posts:api_group_posts', kwargs={'slug': self.group.slug}
+        ) + '?limit=1')
+        self.assertEqual(group_ids, [self.posts[3].id, self.posts[1].id])
+
+    def test_post_fields(self):
+        with self.assertNumQueries(1):
+            data = self.client.get(self.index_url).json()
+        self.assertIsNone(data['next'])
+        post = data['results'][0]
+        self.assertEqual(post['id'], self.posts[-1].id)
+        self.assertEqual(post['text'], 'Пост 4')
+        self.assertEqual(post['author'], 'test_author')
+        self.assertIsNone(post['group'])
+        self.assertIsNone(post['image'])
+        self.assertEqual(data['results'][1]['group'], 'test-group')
+
+    def test_profile_and_detail(self):
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse(
+                'posts:api_profile', kwargs={'username': 'test_author'}
+            )).json()
+        self.assertEqual(data['author']['username'], 'test_author')
+        self.assertEqual(len(data['results']), 5)
+        url = reverse(
+            'posts:api_post_detail', kwargs={'post_id': self.posts[1].id}
+        )
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.json()['group'], 'test-group')
+        not_modified = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_feed_etag_is_checked_without_queries(self):
+        etag = self.client.get(self.index_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                self.index_url, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(self.index_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['text'], 'Новый пост')
+
+    def test_errors(self):
+        cases = {
+            self.index_url + '?cursor=broken': 400,
+            reverse('posts:api_group_posts', kwargs={'slug': 'nope'}): 404,
+            reverse('posts:api_profile', kwargs={'username': 'nope'}): 404,
+            reverse('posts:api_post_detail', kwargs={'post_id': 0}): 404,
+        }
+        for url, status in cases.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
+        response = self.client.post(self.index_url)
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,88 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from ..cache import (METRIC_EVENTS, get_metrics, get_or_compute, lock_key,
+                     metric_key)
+
+
+class GetOrComputeTests(SimpleTestCase):
+    key = 'test:page'
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'значение {self.calls}'
+
+    def put_stale(self, value):
+        cache.set(self.key, (value, time.time() - 1), 60)
+
+    def test_fresh_entry_is_computed_once(self):
+        first = get_or_compute(self.key, self.compute, 60, 600)
+        second = get_or_compute(self.key, self.compute, 60, 600)
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(
+            get_metrics(self.key),
+            {'hit': 1, 'miss': 1, 'stale': 0, 'lock_wait': 0},
+        )
+
+    def test_stale_entry_refreshed_by_lock_holder(self):
+        self.put_stale('старое')
+        value = get_or_compute(self.key, self.compute, 60, 600)
+        self.assertEqual(value, 'значение 1')
+        self.assertEqual(cache.get(self.key)[0], 'значение 1')
+
+    def test_stale_entry_served_while_other_worker_refreshes(self):
+        """пока другой процесс пересчитывает, отдаётся старая копия."""
+        self.put_stale('старое')
+        cache.add(lock_key(self.key), 1)
+        value = get_or_compute(self.key, self.compute, 60, 600)
+        self.assertEqual(value, 'старое')
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(get_metrics(self.key)['stale'], 1)
+
+    def test_miss_waits_for_lock_holder(self):
+        cache.add(lock_key(self.key), 1)
+        with mock.patch('posts.cache.LOCK_WAIT', 0.2):
+            value = get_or_compute(self.key, self.compute, 60, 600)
+        self.assertEqual(value, 'значение 1')
+        self.assertEqual(get_metrics(self.key)['lock_wait'], 1)
+
+    def test_concurrent_misses_compute_once(self):
+        def slow_compute():
+            time.sleep(0.2)
+            return self.compute()
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                get_or_compute(self.key, slow_compute, 60, 600)
+            ))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['значение 1'] * 5)
+
+    def test_uncacheable_value_is_not_stored(self):
+        get_or_compute(
+            self.key, self.compute, 60, 600, cacheable=lambda value: False
+        )
+        self.assertIsNone(cache.get(self.key))
+        self.assertEqual(
+            get_metrics(self.key),
+            {'hit': 0, 'miss': 0, 'stale': 0, 'lock_wait': 0},
+        )
+        self.assertFalse(cache.get_many([
+            metric_key(self.key, event) for event in METRIC_EVENTS
+        ]))
@@ -0,0 +1,117 @@
+from unittest import mock
+from xml.etree import ElementTree
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+class AtomFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='test_author', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Кошки & собаки', slug='test-group', description='-'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                text=f'Пост {number} <b>\x01',
+                group=cls.group if number % 2 else None,
+            )
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.index_url = reverse('posts:index_atom')
+
+    def entries(self, response):
+        self.assertEqual(
+            response['Content-Type'], 'application/atom+xml; charset=utf-8'
+        )
+        root = ElementTree.fromstring(b''.join(response.streaming_content))
+        return root, [
+            entry.find(f'{ATOM}content').text
+            for entry in root.iter(f'{ATOM}entry')
+        ]
+
+    def test_feeds_list_newest_posts(self):
+        urls = {
+            self.index_url: ['Пост 2 <b>', 'Пост 1 <b>', 'Пост 0 <b>'],
+            reverse(
+                'posts:group_atom', kwargs={'slug': self.group.slug}
+            ): ['Пост 1 <b>'],
+            reverse(
+                'posts:author_atom', kwargs={'username': 'test_author'}
+            ): ['Пост 2 <b>', 'Пост 1 <b>', 'Пост 0 <b>'],
+        }
+        for url, texts in urls.items():
+            with self.subTest(url=url):
+                root, entries = self.entries(self.client.get(url))
+                self.assertEqual(entries, texts)
+        author = root.find(f'{ATOM}entry/{ATOM}author/{ATOM}name')
+        self.assertEqual(author.text, 'Лев Толстой')
+
+    def test_since_returns_only_new_entries(self):
+        response = self.client.get(self.index_url)
+        since = response['X-Since-Cursor']
+        _, entries = self.entries(
+            self.client.get(self.index_url, {'since': since})
+        )
+        self.assertEqual(entries, [])
+        Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(self.index_url, {'since': since})
+        _, entries = self.entries(response)
+        self.assertEqual(entries, ['Новый пост'])
+        self.assertNotEqual(response['X-Since-Cursor'], since)
+        response = self.client.get(self.index_url, {'since': 'broken'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_since_catches_up_without_losing_entries(self):
+        since = self.client.get(self.index_url)['X-Since-Cursor']
+        for number in range(3):
+            Post.objects.create(author=self.author, text=f'Новый {number}')
+        pages = []
+        with mock.patch('posts.feeds.ATOM_ENTRIES', 2):
+            for _ in range(3):
+                response = self.client.get(self.index_url, {'since': since})
+                pages.append(self.entries(response)[1])
+                since = response['X-Since-Cursor']
+        self.assertEqual(
+            pages, [['Новый 1', 'Новый 0'], ['Новый 2'], []]
+        )
+
+    def test_feed_is_one_query_and_revalidated_without_queries(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.index_url)
+            self.entries(response)
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(
+                self.index_url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['Surrogate-Key'], 'index')
+
+    def test_unknown_owner_is_404(self):
+        for url in (
+            reverse('posts:group_atom', kwargs={'slug': 'nope'}),
+            reverse('posts:author_atom', kwargs={'username': 'nope'}),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_pages_link_their_feeds(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, f'href="{self.index_url}"')
@@ -1,19 +1,32 @@
+import io
 import tempfile
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
+from PIL import Image, ImageFile, ImageOps
 
-from ..models import Group, Post
+from ..models import Group, ImageIngest, Post
 from ..forms import PostForm
+from ..ingest import normalize_image
+from ..uploads import BoundedTemporaryFileUploadHandler
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
 class PostFormFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -64,7 +77,8 @@ class PostFormFormTests(TestCase):
         self.assertEqual(Post.objects.count(), posts_count + 1)
         self.assertTrue(Post.objects.filter(
                         text='Тестовый текст',
-                        image='posts/small.gif').exists())
+                        image__startswith='posts/',
+                        image__endswith='.gif').exists())
 
     def test_edit_post(self):
         """при отправке валидной формы происходит изменение поста."""
@@ -107,3 +121,130 @@ class PostFormFormTests(TestCase):
             Post.objects.get(id=self.post.id).text,
             PostFormFormTests.post.text
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class PostImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+
+    def setUp(self):
+        self.authorized_author = Client()
+        self.authorized_author.force_login(self.author)
+
+    def upload(self, content, name='small.gif'):
+        return self.authorized_author.post(reverse('posts:create_post'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name, content, 'image/gif'),
+        })
+
+    def assertRejected(self, response, code):
+        form = response.context['form']
+        self.assertEqual(form.errors.as_data()['image'][0].code, code)
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POSTS_IMAGE_MAX_BYTES=len(SMALL_GIF) - 1)
+    def test_large_file_rejected(self):
+        self.assertRejected(self.upload(SMALL_GIF), 'file_too_large')
+
+    @override_settings(POSTS_IMAGE_MAX_PIXELS=1)
+    def test_large_image_rejected_by_header(self):
+        """картинка 2×1 отклоняется по заголовку, без декодирования."""
+        self.assertRejected(self.upload(SMALL_GIF), 'too_many_pixels')
+
+    def test_not_an_image_rejected(self):
+        self.assertRejected(self.upload(b'not an image'), 'invalid_image')
+
+    @override_settings(POSTS_IMAGE_MAX_BYTES=10)
+    def test_handler_stops_writing_past_limit(self):
+        handler = BoundedTemporaryFileUploadHandler()
+        handler.new_file('image', 'small.gif', 'image/gif', len(SMALL_GIF))
+        handler.receive_data_chunk(SMALL_GIF[:8], 0)
+        handler.receive_data_chunk(SMALL_GIF[8:], 8)
+        uploaded = handler.file_complete(len(SMALL_GIF))
+        self.addCleanup(uploaded.close)
+        self.assertEqual(uploaded.size, len(SMALL_GIF))
+        self.assertEqual(uploaded.read(), SMALL_GIF[:8])
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POSTS_IMAGE_MAX_SIDE=100,
+    POSTS_THUMBNAIL_WORKERS=0,
+)
+class ImageIngestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+
+    def setUp(self):
+        self.authorized_author = Client()
+        self.authorized_author.force_login(self.author)
+
+    def camera_jpeg(self):
+        """JPEG 400×200 с EXIF-поворотом на 90° и подписью камеры."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x0110] = 'Камера'
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(
+            buffer, 'JPEG', quality=100, exif=exif.tobytes()
+        )
+        return buffer.getvalue()
+
+    def test_jpeg_is_normalized_and_recorded(self):
+        content = self.camera_jpeg()
+        self.authorized_author.post(reverse('posts:create_post'), {
+            'text': 'Фото с камеры',
+            'image': SimpleUploadedFile('photo.jpeg', content, 'image/jpeg'),
+        })
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (50, 100))
+            self.assertNotIn('exif', image.info)
+            self.assertTrue(image.info.get('progressive'))
+        ingest = ImageIngest.objects.get(name=post.image.name)
+        self.assertEqual(ingest.original_bytes, len(content))
+        self.assertEqual(ingest.stored_bytes, post.image.size)
+        self.assertEqual(
+            (ingest.original_width, ingest.width), (400, 50)
+        )
+        self.assertGreater(ingest.saved_bytes, 0)
+
+    def test_large_jpeg_is_decoded_at_reduced_scale(self):
+        """большой JPEG не декодируется и не поворачивается целиком."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (1600, 800), 'red').save(buffer, 'JPEG')
+        upload = SimpleUploadedFile(
+            'big.jpeg', buffer.getvalue(), 'image/jpeg'
+        )
+        with mock.patch(
+            'posts.ingest.ImageOps.exif_transpose',
+            wraps=ImageOps.exif_transpose,
+        ) as transpose, mock.patch.object(
+            ImageFile.ImageFile, 'load',
+            autospec=True, side_effect=ImageFile.ImageFile.load,
+        ) as load:
+            normalized = normalize_image(upload)
+        decoded = load.call_args_list[0][0][0]
+        self.assertLessEqual(max(decoded.size), 200)
+        self.assertEqual(transpose.call_args[0][0].size, (100, 50))
+        self.assertEqual(normalized.ingest_stats['original_width'], 1600)
+
+    def test_gif_is_stored_as_is(self):
+        self.authorized_author.post(reverse('posts:create_post'), {
+            'text': 'Анимация',
+            'image': SimpleUploadedFile(
+                'animation.gif', SMALL_GIF, 'image/gif'
+            ),
+        })
+        post = Post.objects.get()
+        with post.image.open('rb') as image:
+            self.assertEqual(image.read(), SMALL_GIF)
+        self.assertEqual(
+            ImageIngest.objects.get(name=post.image.name).saved_bytes, 0
+        )
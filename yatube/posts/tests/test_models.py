@@ -1,7 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import AuthorStats, Group, GroupStats, Post
 
 User = get_user_model()
 
@@ -30,3 +33,79 @@ class PostModelTests(TestCase):
         group = PostModelTests.group
         expected_group_str = group.title
         self.assertEqual(expected_group_str, str(group))
+
+
+class PostStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='first',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='second',
+            description='Тестовое описание',
+        )
+
+    def assert_stats(self, stats_model, owner, posts_count):
+        stats = stats_model.objects.get(pk=owner.pk)
+        self.assertEqual(stats.posts_count, posts_count)
+        latest = stats_model.owner_posts(owner.pk).first()
+        self.assertEqual(
+            stats.last_pub_date, latest.pub_date if latest else None
+        )
+
+    def test_counters_follow_create_edit_delete(self):
+        """счётчики меняются при создании, смене группы и удалении."""
+        first = Post.objects.create(
+            author=self.user, text='Первый', group=self.group
+        )
+        second = Post.objects.create(
+            author=self.user, text='Второй', group=self.group
+        )
+        self.assert_stats(AuthorStats, self.user, 2)
+        self.assert_stats(GroupStats, self.group, 2)
+
+        second.group = self.other_group
+        second.save()
+        self.assert_stats(AuthorStats, self.user, 2)
+        self.assert_stats(GroupStats, self.group, 1)
+        self.assert_stats(GroupStats, self.other_group, 1)
+
+        first.delete()
+        self.assert_stats(AuthorStats, self.user, 1)
+        self.assert_stats(GroupStats, self.group, 0)
+
+    def test_counters_follow_author_change(self):
+        post = Post.objects.create(author=self.user, text='Первый')
+        Post.objects.create(author=self.user, text='Второй')
+        other = User.objects.create_user(username='other_author')
+        post.author = other
+        post.save()
+        self.assert_stats(AuthorStats, self.user, 1)
+        self.assert_stats(AuthorStats, other, 1)
+
+    def test_posts_count_for_without_stats_row(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text='Пост') for _ in range(3)
+        )
+        self.assertEqual(AuthorStats.posts_count_for(self.user.pk), 3)
+        self.assertFalse(AuthorStats.objects.filter(pk=self.user.pk).exists())
+
+    def test_post_stats_command_rebuilds_counters(self):
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        AuthorStats.objects.filter(pk=self.user.pk).update(posts_count=42)
+        GroupStats.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, 'Расхождений: 2'):
+            call_command('post_stats', verify=True, stdout=StringIO())
+        self.assertEqual(
+            AuthorStats.objects.get(pk=self.user.pk).posts_count, 42
+        )
+        call_command('post_stats', batch_size=1, stdout=StringIO())
+        self.assert_stats(AuthorStats, self.user, 1)
+        self.assert_stats(GroupStats, self.group, 1)
+        call_command('post_stats', verify=True, stdout=StringIO())
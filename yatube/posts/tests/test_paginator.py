@@ -1,8 +1,13 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from ..cache import INDEX_FEED, count_key
 from ..models import Post, Group
+from ..paginator import KeysetPaginator
 
 
 User = get_user_model()
@@ -31,6 +36,7 @@ class PaginatorViewsTest(TestCase):
         Post.objects.bulk_create(cls.posts)
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -83,3 +89,117 @@ class PaginatorViewsTest(TestCase):
             )
         )
         self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_index_next_cursor_contains_three_records(self):
+        """курсор ?after= открывает вторую страницу без OFFSET."""
+        first_page = self.authorized_client.get(
+            reverse('posts:index')
+        ).context['page_obj']
+        response = self.authorized_client.get(
+            reverse('posts:index'),
+            {'after': first_page.next_cursor},
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 3)
+        self.assertEqual(page_obj.number, 2)
+        self.assertFalse(page_obj.has_next())
+        self.assertTrue(set(first_page).isdisjoint(page_obj))
+
+    def test_index_previous_cursor_returns_first_page(self):
+        """курсор ?before= возвращает на предыдущую страницу."""
+        last_page = self.authorized_client.get(
+            reverse('posts:index'),
+            {'page': 'last'},
+        ).context['page_obj']
+        self.assertEqual(len(last_page), 3)
+        response = self.authorized_client.get(
+            reverse('posts:index'),
+            {'before': last_page.previous_cursor},
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 1)
+        self.assertEqual(len(page_obj), 10)
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.authorized_client.get(
+            reverse('posts:index'),
+            {'after': 'не-курсор'},
+        )
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_count_is_cached_and_follows_writes(self):
+        """число постов берётся из кеша и меняется при записи."""
+        self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(cache.get(count_key(INDEX_FEED)), 13)
+        post = Post.objects.create(text='Новый пост', author=self.user)
+        self.assertEqual(cache.get(count_key(INDEX_FEED)), 14)
+        post.delete()
+        self.assertEqual(cache.get(count_key(INDEX_FEED)), 13)
+        with self.assertNumQueries(3):
+            response = self.authorized_client.get(
+                reverse('posts:index'), {'page': 2}
+            )
+        self.assertEqual(response.context['page_obj'].paginator.count, 13)
+
+    @override_settings(POSTS_COUNT_ESTIMATE_ABOVE=5)
+    def test_estimated_count_above_threshold(self):
+        response = self.authorized_client.get(reverse('posts:index'))
+        paginator = response.context['page_obj'].paginator
+        self.assertTrue(paginator.count_is_estimated)
+        self.assertEqual(paginator.count, 6)
+
+    @override_settings(POSTS_COUNT_ESTIMATE_ABOVE=5)
+    def test_estimate_is_not_adjusted_by_signals(self):
+        """оценка не становится «точной» после удалений."""
+        self.authorized_client.get(reverse('posts:index'))
+        self.assertIsNone(cache.get(count_key(INDEX_FEED)))
+        for post in Post.objects.all()[:3]:
+            post.delete()
+        response = self.authorized_client.get(reverse('posts:index'))
+        paginator = response.context['page_obj'].paginator
+        self.assertTrue(paginator.count_is_estimated)
+        self.assertEqual(paginator.count, 6)
+
+    def test_legacy_page_from_the_tail(self):
+        """страницы у конца ленты открываются OFFSET-ом с хвоста."""
+        with mock.patch('posts.paginator.LEGACY_PAGE_LIMIT', 1):
+            response = self.authorized_client.get(
+                reverse('posts:index'), {'page': 2}
+            )
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 2)
+        self.assertEqual(len(page_obj), 3)
+        self.assertFalse(page_obj.has_next())
+
+
+class ElidedPageRangeTest(TestCase):
+    def get_paginator(self, count):
+        paginator = KeysetPaginator(Post.objects.none(), 10)
+        paginator.count = count
+        return paginator
+
+    def test_short_feed_shows_every_page(self):
+        paginator = self.get_paginator(50)
+        self.assertEqual(
+            paginator.get_elided_page_range(3), [1, 2, 3, 4, 5]
+        )
+
+    def test_window_around_current_page(self):
+        ellipsis = KeysetPaginator.ELLIPSIS
+        paginator = self.get_paginator(2000)
+        self.assertEqual(
+            paginator.get_elided_page_range(10),
+            [1, ellipsis, 8, 9, 10, 11, 12, ellipsis, 200],
+        )
+
+    def test_output_size_does_not_grow_with_feed(self):
+        ellipsis = KeysetPaginator.ELLIPSIS
+        paginator = self.get_paginator(2_000_000)
+        self.assertEqual(
+            paginator.get_elided_page_range(100_000),
+            [1, ellipsis, 100_000, ellipsis, 200_000],
+        )
+        self.assertEqual(
+            paginator.get_elided_page_range(200_000),
+            [1, ellipsis, 199_998, 199_999, 200_000],
+        )
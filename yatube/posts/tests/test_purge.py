@@ -0,0 +1,218 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from ..bulk import move_to_group
+from ..models import Group, Post
+from ..purge import (HttpPurger, collect_purges, flush_purges, get_purger,
+                     purge_later)
+
+User = get_user_model()
+
+
+class EdgeCacheHeadersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-group', description='-'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Тестовый пост', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+        self.pages = {
+            reverse('posts:index'): 'index',
+            reverse(
+                'posts:group_posts', kwargs={'slug': self.group.slug}
+            ): 'group-test-group',
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ): 'author-test_author',
+            reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.id}
+            ): f'post-{self.post.id} author-test_author',
+        }
+
+    def test_anonymous_pages_are_public_with_surrogate_keys(self):
+        for url, keys in self.pages.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response['Surrogate-Key'], keys)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('s-maxage=3600', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+
+    def test_not_modified_keeps_surrogate_keys(self):
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['Surrogate-Key'], 'index')
+
+    def test_authorized_pages_are_private(self):
+        for url in self.pages:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertNotIn('Surrogate-Key', response)
+                self.assertIn('private', response['Cache-Control'])
+
+    def test_missing_pages_are_not_tagged(self):
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('Surrogate-Key', response)
+
+
+class PurgeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-group', description='-'
+        )
+
+    def setUp(self):
+        flush_purges()
+        get_purger().clear()
+
+    def purged(self):
+        # В TestCase on_commit не срабатывает, сбрасываем вручную.
+        flush_purges()
+        return get_purger().purged
+
+    def test_post_save_and_delete_purge_its_pages(self):
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group
+        )
+        self.assertEqual(self.purged(), {
+            'index', 'author-test_author', 'group-test-group',
+        })
+        get_purger().clear()
+        post.text = 'Новый текст'
+        post.save()
+        self.assertIn(f'post-{post.pk}', self.purged())
+        get_purger().clear()
+        post_id = post.pk
+        post.delete()
+        self.assertIn(f'post-{post_id}', self.purged())
+
+    def test_group_rename_and_delete_purge_its_pages(self):
+        Post.objects.create(author=self.author, text='Пост', group=self.group)
+        self.purged()
+        get_purger().clear()
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        self.assertEqual(self.purged(), {'group-test-group'})
+        get_purger().clear()
+        group.slug = 'renamed'
+        group.save()
+        self.assertEqual(self.purged(), {
+            'group-test-group', 'group-renamed', 'index',
+            'author-test_author',
+        })
+        get_purger().clear()
+        group.delete()
+        self.assertEqual(self.purged(), {
+            'group-renamed', 'index', 'author-test_author',
+        })
+
+    def test_keys_of_one_transaction_are_sent_together(self):
+        Post.objects.create(author=self.author, text='Первый')
+        Post.objects.create(author=self.author, text='Второй')
+        self.assertEqual(self.purged(), {'index', 'author-test_author'})
+        self.assertEqual(len(get_purger().sent), 1)
+
+    @override_settings(POSTS_PURGER={
+        'BACKEND': 'posts.purge.LocalPurger',
+        'OPTIONS': {'batch_size': 2},
+    })
+    def test_keys_are_sent_in_batches(self):
+        purge_later(['a', 'b', 'c', 'd', 'e'])
+        flush_purges()
+        self.assertEqual(
+            list(get_purger().sent), [['a', 'b'], ['c', 'd'], ['e']]
+        )
+
+    def test_bulk_actions_purge_every_post(self):
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+            for number in range(3)
+        ]
+        flush_purges()
+        get_purger().clear()
+        move_to_group(Post.objects.all(), self.group)
+        purged = self.purged()
+        for post in posts:
+            self.assertIn(f'post-{post.pk}', purged)
+        self.assertIn('group-test-group', purged)
+
+    def test_http_purger_sends_surrogate_key_header(self):
+        purger = HttpPurger(
+            'http://cache.local/purge',
+            headers={'Fastly-Key': 'secret'},
+            batch_size=2,
+        )
+        with mock.patch('urllib.request.urlopen') as urlopen:
+            purger.purge(['post-1', 'index', 'group-cats'])
+        requests = [call.args[0] for call in urlopen.call_args_list]
+        self.assertEqual(
+            [request.get_header('Surrogate-key') for request in requests],
+            ['group-cats index', 'post-1'],
+        )
+        self.assertEqual(requests[0].get_method(), 'POST')
+        self.assertEqual(requests[0].get_header('Fastly-key'), 'secret')
+
+
+class PurgeBatchingTests(TransactionTestCase):
+    """С настоящими коммитами, в отличие от TestCase."""
+
+    def setUp(self):
+        cache.clear()
+        flush_purges()
+        self.author = User.objects.create_user(username='test_author')
+        self.groups = [
+            Group.objects.create(
+                title=f'Группа {slug}', slug=slug, description='-'
+            )
+            for slug in ('cats', 'dogs')
+        ]
+        self.post = Post.objects.create(
+            author=self.author, text='Пост', group=self.groups[0]
+        )
+        self.client.force_login(self.author)
+        get_purger().clear()
+
+    def test_post_edit_request_sends_one_batch(self):
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'Новый текст', 'group': self.groups[1].id},
+        )
+        self.assertEqual(list(get_purger().sent), [sorted([
+            'author-test_author', 'group-cats', 'group-dogs', 'index',
+            f'post-{self.post.id}',
+        ])])
+
+    def test_collect_purges_outside_requests(self):
+        """без collect_purges() каждый коммит сбрасывает свои ключи."""
+        self.post.save()
+        self.assertGreater(len(get_purger().sent), 1)
+        get_purger().clear()
+        with collect_purges():
+            self.post.save()
+            self.post.delete()
+            self.assertEqual(len(get_purger().sent), 0)
+        self.assertEqual(len(get_purger().sent), 1)
@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class FeedQueryPlanTests(TestCase):
+    """Запросы лент не должны сканировать таблицу и сортировать во
+    временном B-дереве."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='plan_author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='plan_slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост №{number}', author=cls.author, group=cls.group)
+            for number in range(25)
+        )
+        cls.post = Post.objects.first()
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def assert_plans_use_indexes(self, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if 'posts_post' not in sql or not sql.startswith('SELECT'):
+                continue
+            # SQLite-бэкенд сохраняет запрос с уже подставленными
+            # параметрами, поэтому его можно выполнить как есть.
+            for step in explain(sql):
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertNotIn('USE TEMP B-TREE', step)
+                    if step.startswith('SCAN'):
+                        self.assertIn('INDEX', step)
+
+    def feed_urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+        )
+
+    def test_feed_first_pages(self):
+        for url in self.feed_urls():
+            self.assert_plans_use_indexes(url)
+
+    def test_feed_cursor_pages(self):
+        for url in self.feed_urls():
+            page_obj = self.guest_client.get(url).context['page_obj']
+            self.assert_plans_use_indexes(
+                url, {'after': page_obj.next_cursor}
+            )
+            self.assert_plans_use_indexes(url, {'page': 'last'})
+
+    def test_feed_legacy_pages(self):
+        for url in self.feed_urls():
+            self.assert_plans_use_indexes(url, {'page': 2})
+
+    def test_post_detail(self):
+        self.assert_plans_use_indexes(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
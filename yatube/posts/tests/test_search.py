@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..search import match_expression, search_posts
+
+User = get_user_model()
+
+
+class PostSearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.cats = Post.objects.create(
+            author=cls.author, text='Коты и котята. Кот, кот и ещё кот!'
+        )
+        cls.cat = Post.objects.create(
+            author=cls.author, text='Сегодня видел кота во дворе'
+        )
+        cls.dog = Post.objects.create(
+            author=cls.author, text='Собака лаяла на ёжика'
+        )
+
+    def search(self, query):
+        return list(search_posts(Post.objects.all(), query))
+
+    def test_russian_word_forms_are_found(self):
+        """«котами» находит «кот» и «кота»."""
+        self.assertEqual(self.search('котами'), [self.cats, self.cat])
+        self.assertEqual(self.search('ежики'), [self.dog])
+        self.assertEqual(self.search('кот собака'), [])
+
+    def test_other_words_with_same_prefix_are_not_found(self):
+        """основа сравнивается целиком, а не как префикс."""
+        posts = {
+            text: Post.objects.create(author=self.author, text=text)
+            for text in (
+                'Человек, который смеётся', 'Котлеты по-киевски',
+                'Машинально кивнул', 'Домашний уют',
+                'Новые машины', 'Два дома',
+            )
+        }
+        cases = {
+            'коты': [self.cats, self.cat],
+            'кот': [self.cats, self.cat],
+            'машины': [posts['Новые машины']],
+            'дома': [posts['Два дома']],
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), expected)
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(match_expression('кот" OR *'), '"кот" "or"')
+        self.assertEqual(self.search('"собака" NEAR'), [])
+        self.assertEqual(self.search('?!'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        Post.objects.filter(pk=self.dog.pk).update(text='Про котов')
+        self.assertIn(self.dog, self.search('кот'))
+        self.assertEqual(self.search('собака'), [])
+        Post.objects.filter(pk=self.cat.pk).delete()
+        self.assertNotIn(self.cat, self.search('кот'))
+
+    def test_search_page_and_admin_use_index(self):
+        response = Client().get(reverse('posts:search'), {'q': 'собаки'})
+        self.assertEqual(list(response.context['page_obj']), [self.dog])
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собаки'}
+        )
+        self.assertEqual(list(response.context['cl'].result_list), [self.dog])
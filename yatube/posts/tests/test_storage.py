@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from ..models import MediaFile, Post
+from ..storage import SHARDED_NAME
+from ..signals import delete_unused_image
+from ..thumbnails import backend, declared_geometries, enqueue_thumbnails
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\xFF\x00')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, content, name='small.gif'):
+        return Post.objects.create(
+            author=self.author,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def references(self, name):
+        return MediaFile.objects.get(name=name).references
+
+    def test_same_content_shares_one_file(self):
+        first = self.create_post(SMALL_GIF, 'first.gif')
+        second = self.create_post(SMALL_GIF, 'second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, SHARDED_NAME)
+        self.assertEqual(self.references(first.image.name), 2)
+        digest = os.path.splitext(os.path.basename(first.image.name))[0]
+        self.assertEqual(len([
+            name for name in os.listdir(os.path.dirname(first.image.path))
+            if name.startswith(digest)
+        ]), 1)
+
+    def test_file_deleted_with_last_reference(self):
+        """файл и миниатюры удаляются только вместе с последней ссылкой."""
+        first = self.create_post(SMALL_GIF)
+        second = self.create_post(SMALL_GIF)
+        name = first.image.name
+        enqueue_thumbnails(name)
+        geometry, options = declared_geometries()[0]
+        thumbnail = backend.get_ready_thumbnail(
+            first.image, geometry, **options
+        )
+        self.assertTrue(thumbnail.exists())
+        first.delete()
+        delete_unused_image(name)
+        self.assertEqual(self.references(name), 1)
+        self.assertTrue(second.image.storage.exists(name))
+        second.delete()
+        delete_unused_image(name)
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+        self.assertFalse(second.image.storage.exists(name))
+        self.assertIsNone(
+            backend.get_ready_thumbnail(second.image, geometry, **options)
+        )
+        self.assertFalse(thumbnail.exists())
+
+    def test_new_image_moves_reference(self):
+        post = self.create_post(SMALL_GIF)
+        old_name = post.image.name
+        post.image = SimpleUploadedFile('other.gif', OTHER_GIF, 'image/gif')
+        post.save()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertEqual(self.references(old_name), 0)
+        self.assertEqual(self.references(post.image.name), 1)
+
+    def test_upload_survives_pending_delete_of_same_file(self):
+        """удаление последней ссылки не гонится с повторной загрузкой."""
+        name = self.create_post(SMALL_GIF).image.name
+        Post.objects.get(image=name).delete()
+        storage = Post._meta.get_field('image').storage
+        exists = storage.exists
+
+        def delete_after_check(checked):
+            found = exists(checked)
+            delete_unused_image(checked)
+            return found
+
+        with mock.patch.object(
+            storage, 'exists', side_effect=delete_after_check
+        ):
+            post = self.create_post(SMALL_GIF)
+        self.assertEqual(self.references(name), 1)
+        self.assertTrue(storage.exists(name))
+        post.image = SimpleUploadedFile('same.gif', SMALL_GIF, 'image/gif')
+        post.save()
+        self.assertEqual(self.references(name), 1)
+
+    def test_shard_media_moves_flat_files(self):
+        """команда переносит плоские пути в posts/ab/cd/ и правит базу."""
+        post = self.create_post(SMALL_GIF)
+        flat_name = 'posts/legacy.gif'
+        with open(os.path.join(TEMP_MEDIA_ROOT, flat_name), 'wb') as legacy:
+            legacy.write(OTHER_GIF)
+        MediaFile.rename(post.image.name, flat_name)
+        Post.objects.filter(pk=post.pk).update(image=flat_name)
+        call_command('shard_media', batch_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertRegex(post.image.name, SHARDED_NAME)
+        with post.image.open('rb') as image:
+            self.assertEqual(image.read(), OTHER_GIF)
+        self.assertEqual(self.references(post.image.name), 1)
+        self.assertFalse(MediaFile.objects.filter(name=flat_name).exists())
+        self.assertTrue(post.image.storage.exists(flat_name))
+        Post.objects.filter(pk=post.pk).update(image=flat_name)
+        call_command('shard_media', delete_old=True, stdout=StringIO())
+        self.assertFalse(post.image.storage.exists(flat_name))
+
+    def test_garbage_collector_removes_only_orphans(self):
+        post = self.create_post(SMALL_GIF)
+        enqueue_thumbnails(post.image.name)
+        geometry, options = declared_geometries()[0]
+        thumbnail = backend.get_ready_thumbnail(
+            post.image, geometry, **options
+        )
+        orphans = ['posts/orphan.gif', 'cache/zz/zz/orphan.jpg']
+        for name in orphans:
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as orphan:
+                orphan.write(OTHER_GIF)
+            os.utime(path, (0, 0))
+        output = StringIO()
+        call_command('collect_media_garbage', dry_run=True, stdout=output)
+        self.assertIn('Будет удалено картинок: 1', output.getvalue())
+        self.assertIn('Будет удалено миниатюр: 1', output.getvalue())
+        self.assertTrue(post.image.storage.exists(orphans[0]))
+        call_command(
+            'collect_media_garbage', pause=0, batch_size=1, stdout=StringIO()
+        )
+        for name in orphans:
+            self.assertFalse(post.image.storage.exists(name))
+        self.assertTrue(post.image.storage.exists(post.image.name))
+        self.assertTrue(thumbnail.exists())
@@ -0,0 +1,177 @@
+import shutil
+import tempfile
+import os
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from .. import thumbnails
+from ..models import Post
+from ..thumbnails import (backend, declared_geometries, enqueue_thumbnails,
+                          image_variants, prefetch_thumbnails)
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}
+        )
+
+    def ready(self):
+        geometry, options = declared_geometries()[0]
+        return backend.get_ready_thumbnail(
+            self.post.image, geometry, **options
+        )
+
+    def test_pending_thumbnail_serves_original(self):
+        """пока миниатюры нет, страница отдаёт оригинал и не трогает PIL."""
+        with mock.patch('sorl.thumbnail.default.engine') as engine:
+            response = self.guest_client.get(self.detail_url)
+        engine.get_image.assert_not_called()
+        self.assertIsNone(self.ready())
+        self.assertContains(response, self.post.image.url)
+
+    def test_generated_thumbnail_is_rendered(self):
+        enqueue_thumbnails(self.post.image.name)
+        thumbnail = self.ready()
+        self.assertIsNotNone(thumbnail)
+        response = self.guest_client.get(self.detail_url)
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, self.post.image.url)
+
+    @override_settings(POSTS_IMAGE_VARIANTS={
+        'aspect': (2, 1), 'widths': [200, 100], 'formats': ['WEBP', 'JPEG'],
+    })
+    def test_picture_lists_every_ready_variant(self):
+        """<picture> перечисляет в srcset все готовые варианты."""
+        enqueue_thumbnails(self.post.image.name)
+        response = self.guest_client.get(self.detail_url)
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'type="image/jpeg"')
+        for geometry, options, width, _ in image_variants():
+            thumbnail = backend.get_ready_thumbnail(
+                self.post.image, geometry, **options
+            )
+            self.assertContains(response, f'{thumbnail.url} {width}w')
+        self.assertIn(('100x50', {
+            'crop': 'center', 'upscale': True, 'format': 'WEBP',
+        }), declared_geometries())
+
+    def test_generated_variants_refresh_cached_card(self):
+        """карточка и лента обновляются, дата правки поста — нет."""
+        authorized_client = Client()
+        authorized_client.force_login(self.author)
+        clients = (self.guest_client, authorized_client)
+        for client in clients:
+            response = client.get(reverse('posts:index'))
+            self.assertNotContains(response, '<source')
+        enqueue_thumbnails(self.post.image.name)
+        for client in clients:
+            response = client.get(reverse('posts:index'))
+            self.assertContains(response, '<source')
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).updated_at,
+            self.post.updated_at,
+        )
+
+    def test_prefetch_resolves_page_in_one_query(self):
+        """готовые и отсутствующие миниатюры страницы — один запрос."""
+        enqueue_thumbnails(self.post.image.name)
+        other = Post.objects.create(
+            author=self.author,
+            text='Ещё пост',
+            image=SimpleUploadedFile(
+                'other.gif', SMALL_GIF.replace(b'\xFF', b'\x00'),
+                'image/gif',
+            ),
+        )
+        cache.clear()
+        posts = list(Post.objects.filter(pk__in=[self.post.pk, other.pk]))
+        with self.assertNumQueries(1):
+            prefetch_thumbnails(posts)
+        geometry, options = declared_geometries()[0]
+        with mock.patch('sorl.thumbnail.default.kvstore') as kvstore:
+            ready = {
+                post.pk: backend.get_ready_thumbnail(
+                    post.image, geometry, **options
+                )
+                for post in posts
+            }
+        kvstore.get.assert_not_called()
+        self.assertIsNotNone(ready[self.post.pk])
+        self.assertIsNone(ready[other.pk])
+        with self.assertNumQueries(0):
+            prefetch_thumbnails(posts)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=1)
+class ThumbnailPoolTests(TransactionTestCase):
+    """Настоящий пул процессов: задачи уходят в spawn-процесс."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(self.shutdown_pool)
+        author = User.objects.create_user(username='pool_author')
+        self.post = Post.objects.create(
+            author=author,
+            text='Пост для пула',
+            image=SimpleUploadedFile('pool.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def shutdown_pool(self):
+        if thumbnails._executor is not None:
+            thumbnails._executor.shutdown()
+            thumbnails._executor = None
+
+    def test_worker_generates_thumbnails(self):
+        future = enqueue_thumbnails(self.post.image.name)
+        future.result(timeout=120)
+        for geometry, options in declared_geometries():
+            self.assertIsNotNone(backend.get_ready_thumbnail(
+                self.post.image, geometry, **options
+            ))
+
+    def test_broken_pool_is_replaced(self):
+        """после гибели процесса пула запросы не падают, пул пересоздаётся."""
+        broken = thumbnails.get_executor()
+        crash = broken.submit(os._exit, 1)
+        crash.exception(timeout=120)
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            self.assertIsNone(enqueue_thumbnails(self.post.image.name))
+        self.assertIsNot(thumbnails.get_executor(), broken)
+        future = enqueue_thumbnails(self.post.image.name)
+        future.result(timeout=120)
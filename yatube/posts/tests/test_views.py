@@ -1,11 +1,19 @@
+import time
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django import forms
 from django.db.models.fields.files import ImageFieldFile
 # from django.core.files.uploadedfile import SimpleUploadedFile
 
-from ..models import Post, Group
+from core.decorators import QueryBudgetExceeded, query_budget
+from ..cache import (VERSION_TIMEOUT, author_feed, get_metrics, group_feed,
+                     version_key)
+from ..models import AuthorStats, Post, Group
 
 
 User = get_user_model()
@@ -182,3 +190,243 @@ class TaskPagesTests(TestCase):
                 response = self.authorized_author.get(page_obj)
                 image = response.context["page_obj"][0].image
                 self.assertIsInstance(image, ImageFieldFile)
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.group = Group.objects.create(
+            title='test_group_title',
+            slug='test_group_slug',
+            description='test_group_descrioption'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост №{number}', author=cls.author, group=cls.group)
+            for number in range(10)
+        )
+        AuthorStats.recount(cls.author.pk)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_feeds_do_not_query_per_post(self):
+        """число запросов ленты не зависит от числа постов на странице."""
+        urls = {
+            reverse('posts:index'): 1,
+            reverse(
+                'posts:group_posts', kwargs={'slug': self.group.slug}
+            ): 2,
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ): 3,
+        }
+        for url, queries in urls.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    self.guest_client.get(url)
+
+    def test_post_detail_does_not_refetch_author(self):
+        post = Post.objects.first()
+        with self.assertNumQueries(2):
+            self.guest_client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.id})
+            )
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_budget_exceeded_raises_in_strict_mode(self):
+        @query_budget(1)
+        def view(request):
+            list(Post.objects.all())
+            list(Group.objects.all())
+            return HttpResponse()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            view(RequestFactory().get('/'))
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_budget_exceeded_logs_in_production(self):
+        @query_budget(0)
+        def view(request):
+            list(Post.objects.all())
+            return HttpResponse()
+
+        with self.assertLogs('core.decorators', level='WARNING'):
+            response = view(RequestFactory().get('/'))
+        self.assertEqual(response.status_code, 200)
+
+
+class FeedTestMixin:
+    """Автор, группа, пост и адреса трёх лент; своих тестов нет."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.group = Group.objects.create(
+            title='test_group_title',
+            slug='test_group_slug',
+            description='test_group_descrioption'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый текст',
+            group=cls.group
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': cls.group.slug}),
+            reverse(
+                'posts:profile', kwargs={'username': cls.author.username}
+            ),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_author = Client()
+        self.authorized_author.force_login(self.author)
+
+
+class FeedPageCacheTests(FeedTestMixin, TestCase):
+    def test_anonymous_pages_served_from_cache(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.guest_client.get(url)
+                self.assertEqual(first.content, second.content)
+
+    def test_new_post_invalidates_feeds(self):
+        for url in self.urls:
+            self.guest_client.get(url)
+        Post.objects.create(
+            author=self.author,
+            text='Свежий пост',
+            group=self.group
+        )
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Свежий пост')
+
+    def test_missing_owner_leaves_no_permanent_keys(self):
+        urls = {
+            reverse('posts:group_posts', kwargs={'slug': 'nope'}):
+                group_feed('nope'),
+            reverse('posts:api_group_posts', kwargs={'slug': 'nope'}):
+                group_feed('nope'),
+            reverse('posts:profile', kwargs={'username': 'nope'}):
+                author_feed('nope'),
+        }
+        for url, feed in urls.items():
+            self.assertEqual(self.guest_client.get(url).status_code, 404)
+            self.assertFalse(any(get_metrics(feed).values()))
+        later = time.time() + VERSION_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            for feed in urls.values():
+                self.assertIsNone(cache.get(version_key(feed)))
+
+    def test_group_rename_and_delete_invalidate_pages(self):
+        old_url = self.urls[1]
+        self.guest_client.get(old_url)
+        self.guest_client.get(self.urls[0])
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        self.assertEqual(self.guest_client.get(old_url).status_code, 404)
+        new_url = reverse('posts:group_posts', kwargs={'slug': 'renamed'})
+        self.assertEqual(self.guest_client.get(new_url).status_code, 200)
+        self.assertContains(self.guest_client.get(self.urls[0]), new_url)
+        group.delete()
+        self.assertEqual(self.guest_client.get(new_url).status_code, 404)
+        self.assertNotContains(self.guest_client.get(self.urls[0]), new_url)
+
+    def test_author_change_invalidates_old_profile(self):
+        self.guest_client.get(self.urls[2])
+        self.post.author = User.objects.create_user(username='new_author')
+        self.post.save()
+        response = self.guest_client.get(self.urls[2])
+        self.assertNotContains(response, 'Тестовый текст')
+
+    def test_post_edit_invalidates_feeds(self):
+        for url in self.urls:
+            self.guest_client.get(url)
+        self.authorized_author.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'Отредактированный текст', 'group': self.group.id},
+        )
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Отредактированный текст')
+
+    def test_authenticated_users_bypass_cache(self):
+        self.guest_client.get(self.urls[0])
+        response = self.authorized_author.get(self.urls[0])
+        self.assertIsNotNone(response.context)
+        self.assertContains(response, 'Пользователь: test_author')
+
+    def test_post_card_fragment_cached_until_post_changes(self):
+        """карточка поста перерисовывается только после его изменения."""
+        self.authorized_author.get(self.urls[0])
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        response = self.authorized_author.get(self.urls[0])
+        self.assertContains(response, 'Тестовый текст')
+        post = Post.objects.get(pk=self.post.pk)
+        post.save()
+        response = self.authorized_author.get(self.urls[0])
+        self.assertContains(response, 'Тихая правка')
+
+
+class ConditionalGetTests(FeedTestMixin, TestCase):
+    def detail_url(self):
+        return reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+
+    def test_unchanged_feed_returns_304_without_queries(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_new_post_changes_feed_validators(self):
+        etags = {url: self.guest_client.get(url)['ETag'] for url in self.urls}
+        Post.objects.create(
+            author=self.author, text='Свежий пост', group=self.group
+        )
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Last-Modified', response)
+
+    def test_etag_depends_on_user(self):
+        guest = self.guest_client.get(self.urls[0])['ETag']
+        response = self.authorized_author.get(
+            self.urls[0], HTTP_IF_NONE_MATCH=guest
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_detail_validated_by_one_query(self):
+        response = self.guest_client.get(self.detail_url())
+        with self.assertNumQueries(1):
+            not_modified = self.guest_client.get(
+                self.detail_url(), HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        not_modified = self.guest_client.get(
+            self.detail_url(),
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        self.post.save()
+        response = self.guest_client.get(
+            self.detail_url(), HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
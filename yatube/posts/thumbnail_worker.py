@@ -0,0 +1,36 @@
+"""Точка входа процессов пула миниатюр.
+
+Пул запускает процессы через spawn: новый процесс импортирует этот модуль,
+чтобы найти функцию задачи, ещё до инициализатора. Поэтому здесь нет
+импортов Django и sorl на уровне модуля — posts.thumbnails подключается
+только после django.setup().
+"""
+import os
+
+
+def init_worker(settings_module, overrides):
+    """Поднимает Django в процессе пула.
+
+    overrides — настройки родителя, которые могли поменяться после
+    импорта settings (база и кеш тестов, MEDIA_ROOT).
+    """
+    os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+    from django.conf import settings
+
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+
+    import django
+
+    django.setup()
+
+
+def run(name, geometries):
+    from django.db import close_old_connections
+
+    from posts.thumbnails import generate_thumbnails
+
+    try:
+        generate_thumbnails(name, geometries)
+    finally:
+        close_old_connections()
@@ -0,0 +1,277 @@
+"""Миниатюры картинок постов, которые готовятся вне запроса.
+
+Шаблоны только читают готовые миниатюры из key-value хранилища sorl
+(post_picture) и никогда не открывают картинку через PIL. Создаёт
+миниатюры пул процессов: create_post и post_edit ставят в него все
+варианты из POSTS_IMAGE_VARIANTS после сохранения поста.
+"""
+import functools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.cache import cache
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+
+from posts import thumbnail_worker
+from posts.storage import image_storage
+
+logger = logging.getLogger(__name__)
+
+# Пока миниатюра в очереди, повторно её не ставим.
+PENDING_TIMEOUT = 60
+MIME_TYPES = {
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+}
+
+_executor = None
+
+
+class PostThumbnailBackend(ThumbnailBackend):
+    def prepare_options(self, source, options):
+        """Те же умолчания, что подставляет ThumbnailBackend.get_thumbnail."""
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        options = self.prepare_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Готовая миниатюра или None; картинку не открывает.
+
+        Если для файла вызывали prefetch_thumbnails, ответ берётся оттуда.
+        """
+        if not file_:
+            return None
+        thumbnail = self.thumbnail_file(file_, geometry_string, **options)
+        prefetched = getattr(file_, 'prefetched_thumbnails', None)
+        if prefetched is not None and thumbnail.key in prefetched:
+            return prefetched[thumbnail.key]
+        return default.kvstore.get(thumbnail)
+
+
+backend = PostThumbnailBackend()
+
+
+def image_variants():
+    """Варианты картинки: (geometry, options, ширина, формат)."""
+    config = settings.POSTS_IMAGE_VARIANTS
+    aspect_width, aspect_height = config['aspect']
+    variants = []
+    for image_format in config['formats']:
+        for width in sorted(config['widths']):
+            height = round(width * aspect_height / aspect_width)
+            options = {
+                'crop': 'center',
+                'upscale': True,
+                'format': image_format,
+            }
+            variants.append(
+                (f'{width}x{height}', options, width, image_format)
+            )
+    return variants
+
+
+def declared_geometries():
+    return [
+        (geometry, options) for geometry, options, *_ in image_variants()
+    ]
+
+
+def ready_variants(image):
+    """Готовые варианты картинки: {формат: [(ImageFile, ширина), ...]}."""
+    variants = {}
+    # Варианты создаются одной задачей по порядку: пока нет последнего,
+    # остальные не ищем, и для картинки в очереди это один запрос.
+    for geometry, options, width, image_format in reversed(image_variants()):
+        thumbnail = backend.get_ready_thumbnail(image, geometry, **options)
+        if thumbnail is None:
+            break
+        variants.setdefault(image_format, []).insert(0, (thumbnail, width))
+    return dict(reversed(variants.items()))
+
+
+def source_file(name):
+    # Ключи миниатюр sorl зависят от хранилища исходника.
+    return ImageFile(name, image_storage)
+
+
+def delete_image(name):
+    """Удаляет файл картинки вместе с её миниатюрами."""
+    backend.delete(source_file(name))
+
+
+def fetch_kvstore(keys):
+    """Значения хранилища sorl по списку ключей: кеш get_many + один запрос.
+
+    Повторяет логику cached_db: найденное в базе и отсутствие записи
+    запоминаются в кеше.
+    """
+    kvstore = default.kvstore
+    empty = cached_db_kvstore.EMPTY_VALUE
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    from sorl.thumbnail.models import KVStore
+
+    found = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        stored = dict(
+            KVStore.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        kvstore.cache.set_many(
+            {key: stored.get(key, empty) for key in missing},
+            thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT,
+        )
+        found.update(stored)
+    return {
+        key: value for key, value in found.items()
+        if value is not None and value != empty
+    }
+
+
+def prefetch_thumbnails(posts):
+    """Находит все миниатюры и варианты картинок постов разом.
+
+    Результат кладётся в post.image.prefetched_thumbnails, и
+    get_ready_thumbnail больше не ходит в хранилище sorl за каждой
+    картинкой.
+    """
+    thumbnails = {}
+    for post in posts:
+        if not post.image:
+            continue
+        post.image.prefetched_thumbnails = {}
+        for geometry, options in declared_geometries():
+            key = backend.thumbnail_file(post.image, geometry, **options).key
+            thumbnails[add_prefix(key)] = (post.image, key)
+    if not thumbnails:
+        return
+    values = fetch_kvstore(list(thumbnails))
+    for raw_key, (image, key) in thumbnails.items():
+        value = values.get(raw_key)
+        image.prefetched_thumbnails[key] = (
+            deserialize_image_file(value) if value is not None else None
+        )
+
+
+def generate_thumbnails(name, geometries):
+    """Создаёт миниатюры файла name в процессе пула или в текущем."""
+    try:
+        for geometry, options in geometries:
+            backend.get_thumbnail(source_file(name), geometry, **options)
+        refresh_pages(name)
+    finally:
+        cache.delete(pending_key(name))
+
+
+def refresh_pages(name):
+    """Сбрасывает ленты и страницы постов с картинкой name.
+
+    Посты не пересохраняются: updated_at — дата правки, которую видят
+    читатели. Карточки перерисуются сами, в их ключе есть
+    picture_version.
+    """
+    from posts.cache import bump_versions, post_feeds
+    from posts.models import Post
+    from posts.purge import collect_purges, post_key, purge_later
+
+    posts = Post.objects.filter(image=name).select_related('author', 'group')
+    with collect_purges():
+        feeds = set()
+        for post in posts:
+            feeds.update(post_feeds(post))
+            purge_later([post_key(post.pk)])
+        bump_versions(feeds)
+
+
+def pending_key(name):
+    # Префикс posts:lock: держит ключ только в общем уровне кеша.
+    return f'posts:lock:thumbnails:{name}'
+
+
+# Настройки, которые процессы пула берут у родителя, а не из settings.py.
+WORKER_SETTINGS = ('DATABASES', 'CACHES', 'MEDIA_ROOT')
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.POSTS_THUMBNAIL_WORKERS,
+            mp_context=get_context('spawn'),
+            initializer=thumbnail_worker.init_worker,
+            initargs=(
+                os.environ['DJANGO_SETTINGS_MODULE'],
+                {name: getattr(settings, name) for name in WORKER_SETTINGS},
+            ),
+        )
+    return _executor
+
+
+def discard_executor(executor):
+    """Забывает сломанный пул; следующая задача запустит новый."""
+    global _executor
+    if _executor is executor:
+        _executor = None
+    executor.shutdown(wait=False)
+
+
+def job_done(name, executor, future):
+    error = future.exception()
+    if error is None:
+        return
+    logger.error('Не удалось создать миниатюры %s: %s', name, error)
+    if isinstance(error, BrokenProcessPool):
+        discard_executor(executor)
+        cache.delete(pending_key(name))
+
+
+def enqueue_thumbnails(name, geometries=None):
+    """Ставит в очередь все миниатюры файла name; возвращает Future.
+
+    При POSTS_THUMBNAIL_WORKERS = 0 миниатюры создаются сразу, в текущем
+    процессе. Сломанный пул не роняет запрос: ошибка пишется в лог, а
+    картинку снова поставят в очередь при следующем показе.
+    """
+    if not name or not cache.add(pending_key(name), 1, PENDING_TIMEOUT):
+        return None
+    geometries = geometries or declared_geometries()
+    if not settings.POSTS_THUMBNAIL_WORKERS:
+        generate_thumbnails(name, geometries)
+        return None
+    executor = get_executor()
+    try:
+        future = executor.submit(thumbnail_worker.run, name, geometries)
+    except (BrokenProcessPool, RuntimeError) as error:
+        # RuntimeError — пул уже остановлен.
+        logger.error('Не удалось создать миниатюры %s: %s', name, error)
+        discard_executor(executor)
+        cache.delete(pending_key(name))
+        return None
+    future.add_done_callback(functools.partial(job_done, name, executor))
+    return future
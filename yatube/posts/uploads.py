@@ -0,0 +1,73 @@
+"""Приём картинок без лишней памяти и полного декодирования.
+
+BoundedTemporaryFileUploadHandler пишет загрузку на диск кусками и
+перестаёт писать, как только файл превысил POSTS_IMAGE_MAX_BYTES.
+read_image_header открывает картинку через PIL лениво: читается только
+заголовок, поэтому размер в пикселях проверяется до декодирования и
+«бомбы» отсекаются сразу.
+"""
+import warnings
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+
+class BoundedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл, но не больше лимита.
+
+    Лишние байты отбрасываются, а file.size остаётся настоящим, так что
+    форма отклонит файл по размеру.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.written = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.written + len(raw_data) > settings.POSTS_IMAGE_MAX_BYTES:
+            return None
+        self.written += len(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+
+def read_image_header(file):
+    """Формат и размеры картинки по заголовку; ValidationError, если нет."""
+    if file.size > settings.POSTS_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)s.',
+            code='file_too_large',
+            params={'limit': filesizeformat(settings.POSTS_IMAGE_MAX_BYTES)},
+        )
+    file.seek(0)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            image = Image.open(file)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise ValidationError(
+            'Слишком большая картинка.', code='too_many_pixels'
+        )
+    except Exception:
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image'
+        )
+    if image.format not in ALLOWED_FORMATS:
+        raise ValidationError(
+            'Формат %(format)s не поддерживается.',
+            code='invalid_image_format',
+            params={'format': image.format},
+        )
+    width, height = image.size
+    if width * height > settings.POSTS_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Слишком большая картинка: %(width)s×%(height)s.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+    file.seek(0)
+    return image
@@ -1,19 +1,65 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import get_object_or_404, render, redirect
 
-from posts.models import Post, Group, User
+from core.decorators import query_budget
+from posts.models import AuthorStats, ImageIngest, Post, Group, User
+from posts.cache import (INDEX_FEED, author_feed, cache_feed_page, count_key,
+                         group_feed)
+from posts.conditional import feed_condition, post_condition, post_validators
 from posts.forms import PostForm
+from posts.paginator import KeysetPaginator
+from posts.purge import (INDEX_KEY, author_key, cache_at_edge, group_key,
+                         post_key)
+from posts.search import search_posts
+from posts.thumbnails import enqueue_thumbnails, prefetch_thumbnails
 
 
 POST_COUNT = 10
 
 
+def schedule_thumbnails(post):
+    if post.image:
+        transaction.on_commit(lambda: enqueue_thumbnails(post.image.name))
+
+
+def image_uploaded(form, post):
+    stats = getattr(form.cleaned_data.get('image'), 'ingest_stats', None)
+    if stats is not None:
+        ImageIngest.objects.update_or_create(
+            name=post.image.name, defaults=stats
+        )
+    schedule_thumbnails(post)
+
+
+def paginate(request, queryset, feed):
+    paginator = KeysetPaginator(
+        queryset,
+        POST_COUNT,
+        count_key=count_key(feed),
+        estimate_above=settings.POSTS_COUNT_ESTIMATE_ABOVE,
+    )
+    page_obj = paginator.get_cursor_page(request.GET)
+    prefetch_thumbnails(page_obj)
+    return page_obj
+
+
+def detail_keys(request, post_id):
+    # Страница показывает число постов автора, поэтому сбрасывается и
+    # вместе с его лентой.
+    username = post_validators(request, post_id)[3]
+    return [post_key(post_id), author_key(username)]
+
+
+@cache_at_edge(lambda request: [INDEX_KEY])
+@feed_condition(lambda: INDEX_FEED)
+@cache_feed_page(lambda: INDEX_FEED)
+@query_budget(6)
 def index(request):
-    posts = Post.objects.all().order_by('-pub_date')
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.feed()
+    page_obj = paginate(request, posts, INDEX_FEED)
 
     context = {
         'page_obj': page_obj,
@@ -22,12 +68,14 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@cache_at_edge(lambda request, slug: [group_key(slug)])
+@feed_condition(group_feed)
+@cache_feed_page(group_feed)
+@query_budget(7)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.posts.feed()
+    page_obj = paginate(request, posts, group_feed(group.slug))
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -35,13 +83,15 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_at_edge(lambda request, username: [author_key(username)])
+@feed_condition(author_feed)
+@cache_feed_page(author_feed)
+@query_budget(8)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    posts_counter = post_list.count()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = author.posts.feed()
+    posts_counter = AuthorStats.posts_count_for(author.pk)
+    page_obj = paginate(request, post_list, author_feed(author.username))
     context = {
         'author': author,
         'page_obj': page_obj,
@@ -50,10 +100,17 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@cache_at_edge(detail_keys)
+@post_condition
+@query_budget(5)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    username_obj = User.objects.get(username=post.author)
-    posts_counter = username_obj.posts.count()
+    post = get_object_or_404(Post.objects.detail(), id=post_id)
+    prefetch_thumbnails([post])
+    # Счётчик автора уже прочитан вместе с валидаторами post_condition.
+    validators = post_validators(request, post_id)
+    posts_counter = validators[1] if validators else None
+    if posts_counter is None:
+        posts_counter = AuthorStats.posts_count_for(post.author_id)
     template = 'posts/post_detail.html'
     context = {
         'post': post,
@@ -62,6 +119,22 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+@query_budget(5)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = Paginator(
+            search_posts(Post.objects.feed(), query), POST_COUNT
+        ).get_page(request.GET.get('page'))
+        prefetch_thumbnails(page_obj)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required()
 def create_post(request):
     template = 'posts/create_post.html'
@@ -73,6 +146,7 @@ def create_post(request):
         new_post = form.save(commit=False)
         new_post.author = request.user
         new_post.save()
+        image_uploaded(form, new_post)
         return redirect('posts:profile', username=request.user.username)
     context = {
         'form': form,
@@ -92,6 +166,8 @@ def post_edit(request, post_id):
         instance=post)
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            image_uploaded(form, post)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'form': form,
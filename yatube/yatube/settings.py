@@ -52,6 +52,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'posts.purge.PurgeMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -137,9 +138,81 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-
+# Как core.views.serve_media отдаёт файлы: None — сам, 'nginx' — через
+# X-Accel-Redirect на MEDIA_ACCEL_PREFIX (internal location), 'sendfile' —
+# через X-Sendfile (Apache, lighttpd). Имена файлов не переиспользуются,
+# поэтому кешировать их можно долго.
+MEDIA_ACCEL = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_MAX_AGE = 365 * 24 * 60 * 60
+
+# Двухуровневый кеш (core.cache.TwoLevelCache): LRU в памяти воркера перед
+# общим для всех процессов SQLite-файлом. Версии и счётчики лент читаются
+# только из общего уровня, чтобы инвалидация была видна всем воркерам.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.TwoLevelCache',
+        'LOCATION': 'yatube',
+        'OPTIONS': {
+            'SHARED': {
+                'BACKEND': 'core.cache.SQLiteCache',
+                'LOCATION': os.path.join(BASE_DIR, 'cache', 'shared.sqlite3'),
+                'OPTIONS': {'MAX_ENTRIES': 100000},
+            },
+            'SHARED_ONLY_PREFIXES': [
+                'posts:version:',
+                'posts:modified:',
+                'posts:count:',
+                'posts:metrics:',
+                'posts:lock:',
+            ],
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_MAX_BYTES': 32 * 1024 * 1024,
+            'LOCAL_TIMEOUT': 2,
+        },
     }
 }
+
+# Тесты работают с общим кешем и базой во временных файлах
+# (core.test_runner).
+TEST_RUNNER = 'core.test_runner.IsolatedRunner'
+
+# Превышение бюджета запросов (core.decorators.query_budget) в разработке
+# и тестах — ошибка, в продакшене — предупреждение в логе.
+QUERY_BUDGET_STRICT = DEBUG
+
+# Выше этого числа постов лента не считает точный COUNT (см.
+# posts.paginator.CachedCountPaginator); None — считать всегда.
+POSTS_COUNT_ESTIMATE_ABOVE = None
+# В списке постов админки COUNT не считается дальше этого порога.
+POSTS_ADMIN_COUNT_ESTIMATE_ABOVE = 10000
+
+# Варианты картинок постов готовит пул процессов (posts.thumbnails).
+# 0 — создавать их сразу в процессе запроса.
+POSTS_THUMBNAIL_WORKERS = 2
+# Варианты картинки для <picture>/srcset: ширины в пикселях, форматы и
+# пропорции кадра.
+POSTS_IMAGE_VARIANTS = {
+    'aspect': (960, 339),
+    'widths': [320, 640, 960],
+    'formats': ['WEBP', 'JPEG'],
+}
+
+# Загрузки пишутся на диск кусками; картинки больше лимитов отклоняются
+# по заголовку, без декодирования (posts.uploads).
+FILE_UPLOAD_HANDLERS = ['posts.uploads.BoundedTemporaryFileUploadHandler']
+POSTS_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POSTS_IMAGE_MAX_PIXELS = 40_000_000
+# Нормализация картинок при загрузке (posts.ingest).
+POSTS_IMAGE_MAX_SIDE = 2560
+POSTS_IMAGE_QUALITY = 82
+
+# Анонимные страницы постов кешируются на обратном прокси не дольше
+# POSTS_EDGE_MAX_AGE секунд и сбрасываются по Surrogate-Key при записи
+# (posts.purge). В продакшене — posts.purge.HttpPurger с OPTIONS
+# {'endpoint': ...}; LocalPurger только запоминает ключи.
+POSTS_EDGE_MAX_AGE = 60 * 60
+POSTS_PURGER = {
+    'BACKEND': 'posts.purge.LocalPurger',
+    'OPTIONS': {'batch_size': 256},
+}
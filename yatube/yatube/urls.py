@@ -2,7 +2,8 @@
 from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.views import serve_media
 
 
 urlpatterns = [
@@ -13,7 +14,8 @@ urlpatterns = [
     path('about/', include('about.urls', namespace='about')),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
+# В продакшене фронтовой сервер обычно отдаёт media сам; если нет —
+# serve_media поддерживает Range, 304 и передачу через X-Accel-Redirect.
+urlpatterns += [
+    path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>', serve_media),
+]